@@ -1,2 +1,3 @@
 from .authenticator import Authenticator
+from .oauth_client import OAuthClient
 from .token_manager import AuthTokenManager
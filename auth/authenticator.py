@@ -1,8 +1,5 @@
-import time
-
 import streamlit as st
-import google_auth_oauthlib.flow
-from googleapiclient.discovery import build
+from auth.oauth_client import OAuthClient, get_oauth_client
 from auth.token_manager import AuthTokenManager
 
 
@@ -15,8 +12,9 @@ class Authenticator:
         token_key: str,
         cookie_name: str = "auth_jwt",
         token_duration_days: int = 1,
+        cookie_timeout: float = 1.0,
+        oauth_client: OAuthClient = None,
     ):
-        st.session_state["connected"] = st.session_state.get("connected", False)
         self.allowed_users = allowed_users
         self.client_config = client_config
         self.redirect_uri = redirect_uri
@@ -26,32 +24,22 @@ class Authenticator:
             token_duration_days=token_duration_days,
         )
         self.cookie_name = cookie_name
-
-    def _initialize_flow(self) -> google_auth_oauthlib.flow.Flow:
-        flow = google_auth_oauthlib.flow.Flow.from_client_config(
-            self.client_config,
-            scopes=[
-                "openid",
-                "https://www.googleapis.com/auth/userinfo.profile",
-                "https://www.googleapis.com/auth/userinfo.email",
-            ],
-            redirect_uri=self.redirect_uri,
-        )
-        return flow
+        self.cookie_timeout = cookie_timeout
+        self.oauth_client = oauth_client or get_oauth_client(client_config, redirect_uri)
 
     def get_auth_url(self) -> str:
-        flow = self._initialize_flow()
-        auth_url, _ = flow.authorization_url(
-            access_type="offline", include_granted_scopes="true"
-        )
-        return auth_url
+        return self.oauth_client.authorization_url
 
     def login(self):
-        if not st.session_state["connected"]:
+        if not st.session_state.get("connected", False):
             auth_url = self.get_auth_url()
             st.link_button("Login with Google", auth_url)
 
     def check_auth(self):
+        # The authenticator can be shared between sessions, so per-session
+        # state is set up here rather than in __init__
+        st.session_state["connected"] = st.session_state.get("connected", False)
+        self.auth_token_manager.begin_rerun()
 
         if st.session_state["connected"]:
             st.toast(":green[User is authenticated]")
@@ -61,6 +49,9 @@ class Authenticator:
             st.toast(":green[User logged out]")
             return
 
+        # Wait (bounded) for the cookie component instead of a fixed sleep
+        self.auth_token_manager.wait_for_cookies(timeout=self.cookie_timeout)
+
         token = self.auth_token_manager.get_decoded_token()
         if token is not None:
             st.query_params.clear()
@@ -71,17 +62,11 @@ class Authenticator:
             }
             st.rerun()  # update session state
 
-        time.sleep(1)  # important for the token to be set correctly
-
         auth_code = st.query_params.get("code")
         st.query_params.clear()
         if auth_code:
-            flow = self._initialize_flow()
-            flow.fetch_token(code=auth_code)
-            creds = flow.credentials
-
-            oauth_service = build(serviceName="oauth2", version="v2", credentials=creds)
-            user_info = oauth_service.userinfo().get().execute()
+            tokens = self.oauth_client.exchange_code(auth_code)
+            user_info = self.oauth_client.fetch_userinfo(tokens["access_token"])
             oauth_id = user_info.get("id")
             email = user_info.get("email")
 
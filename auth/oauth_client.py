@@ -0,0 +1,92 @@
+from functools import cached_property
+from urllib.parse import urlencode
+
+import requests
+import streamlit as st
+
+SCOPES = [
+    "openid",
+    "https://www.googleapis.com/auth/userinfo.profile",
+    "https://www.googleapis.com/auth/userinfo.email",
+]
+
+# Same endpoint the discovery-built oauth2 v2 ``userinfo().get()`` calls
+USERINFO_URI = "https://www.googleapis.com/oauth2/v2/userinfo"
+
+
+class OAuthClient:
+    """
+    Google OAuth web flow over one reusable HTTP session.
+
+    The authorization URL is built once, the code exchange and the userinfo
+    lookup are plain requests against the endpoints in the client config, so
+    no discovery document is fetched and tests can point ``token_uri`` and
+    ``userinfo_uri`` at a local stub.
+    """
+
+    def __init__(
+        self,
+        client_config: dict,
+        redirect_uri: str,
+        scopes: list = SCOPES,
+        userinfo_uri: str = USERINFO_URI,
+        session: requests.Session = None,
+        timeout: float = 10.0,
+    ):
+        web_config = client_config["web"]
+        self.client_id = web_config["client_id"]
+        self.client_secret = web_config["client_secret"]
+        self.auth_uri = web_config["auth_uri"]
+        self.token_uri = web_config["token_uri"]
+        self.redirect_uri = redirect_uri
+        self.scopes = scopes
+        self.userinfo_uri = userinfo_uri
+        self.session = session or requests.Session()
+        self.timeout = timeout
+
+    @cached_property
+    def authorization_url(self) -> str:
+        query = urlencode(
+            {
+                "response_type": "code",
+                "client_id": self.client_id,
+                "redirect_uri": self.redirect_uri,
+                "scope": " ".join(self.scopes),
+                "access_type": "offline",
+                "include_granted_scopes": "true",
+            }
+        )
+        return f"{self.auth_uri}?{query}"
+
+    def exchange_code(self, code: str) -> dict:
+        response = self.session.post(
+            self.token_uri,
+            data={
+                "code": code,
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "redirect_uri": self.redirect_uri,
+                "grant_type": "authorization_code",
+            },
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def fetch_userinfo(self, access_token: str) -> dict:
+        response = self.session.get(
+            self.userinfo_uri,
+            headers={"Authorization": f"Bearer {access_token}"},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+@st.cache_resource
+def get_oauth_client(client_config: dict, redirect_uri: str) -> OAuthClient:
+    """
+    One OAuthClient (and HTTP connection pool) per process, shared by all
+    reruns and sessions.
+    """
+    return OAuthClient(client_config, redirect_uri)
@@ -1,3 +1,4 @@
+import time
 from datetime import datetime, timedelta
 
 import jwt
@@ -13,19 +14,83 @@ class AuthTokenManager:
         token_key: str,
         token_duration_days: int,
     ):
-        self.cookie_manager = stx.CookieManager()
         self.cookie_name = cookie_name
         self.token_key = token_key
         self.token_duration_days = token_duration_days
-        self.token = None
+
+    @property
+    def cookie_manager(self) -> stx.CookieManager:
+        """
+        One CookieManager per session. The component is only mounted in reruns
+        that actually read cookies, never once the user is connected.
+        """
+        if "cookie_manager" not in st.session_state:
+            # Constructing it mounts the component and reads the cookies
+            st.session_state["cookie_manager"] = stx.CookieManager()
+            st.session_state["cookies_read"] = True
+        return st.session_state["cookie_manager"]
+
+    def begin_rerun(self):
+        """
+        Called once at the start of every rerun: cookies have not been read yet.
+        """
+        st.session_state["cookies_read"] = False
+
+    def _read_cookies(self) -> dict:
+        cookie_manager = self.cookie_manager
+        if not st.session_state.get("cookies_read"):
+            # Same key as the constructor, so this is the same component
+            cookie_manager.get_all(key="init")
+            st.session_state["cookies_read"] = True
+        return cookie_manager.cookies
+
+    def cookies_ready(self) -> bool:
+        if st.session_state.get("cookies_ready"):
+            return True
+        # The component returns its empty default until the browser reports back
+        if self._read_cookies():
+            st.session_state["cookies_ready"] = True
+            return True
+        return False
+
+    def wait_for_cookies(self, timeout: float = 1.0, poll_interval: float = 0.05):
+        """
+        Give the cookie component time to hydrate. When the browser reports its
+        cookies Streamlit requests a rerun, which interrupts this loop at the
+        next placeholder update, so we only wait as long as hydration takes,
+        up to ``timeout``. The wait time is recorded in ``auth_timings``.
+        """
+        if self.cookies_ready():
+            return
+        started = time.perf_counter()
+        placeholder = st.empty()
+        try:
+            while time.perf_counter() - started < timeout:
+                time.sleep(poll_interval)
+                placeholder.empty()
+            # Nothing arrived in time: the browser has no cookies for us
+            st.session_state["cookies_ready"] = True
+        finally:
+            st.session_state.setdefault("auth_timings", {})["cookie_wait"] = (
+                time.perf_counter() - started
+            )
 
     def get_decoded_token(self) -> str:
 
-        self.token = self.cookie_manager.get(self.cookie_name)
-        if self.token is None:
+        # Local variables only: the manager may be shared between sessions
+        token = self._read_cookies().get(self.cookie_name)
+        if token is None:
             return None
-        self.token = self._decode_token()
-        return self.token
+
+        # Claims verified earlier in this session stay valid until they expire
+        cached = st.session_state.get("verified_token")
+        if cached is not None and cached["raw"] == token and cached["claims"]["exp"] > time.time():
+            return cached["claims"]
+
+        decoded = self._decode_token(token)
+        if decoded is not None:
+            st.session_state["verified_token"] = {"raw": token, "claims": decoded}
+        return decoded
 
     def set_token(self, email: str, oauth_id: str):
         exp_date = (
@@ -37,16 +102,21 @@ class AuthTokenManager:
             token,
             expires_at=datetime.fromtimestamp(exp_date),
         )
+        st.session_state["verified_token"] = {
+            "raw": token,
+            "claims": {"email": email, "oauth_id": oauth_id, "exp": exp_date},
+        }
 
     def delete_token(self):
+        st.session_state.pop("verified_token", None)
         try:
             self.cookie_manager.delete(self.cookie_name)
         except KeyError:
             pass
 
-    def _decode_token(self) -> str:
+    def _decode_token(self, token: str) -> str:
         try:
-            decoded = jwt.decode(self.token, self.token_key, algorithms=["HS256"])
+            decoded = jwt.decode(token, self.token_key, algorithms=["HS256"])
             return decoded
         except ExpiredSignatureError:
             st.toast(":red[token expired, please login]")
@@ -0,0 +1,17 @@
+from .changes import (
+    add_change,
+    add_installment_change,
+    apply_changes,
+    attach_change,
+    coalesce_changes,
+    detach_change,
+    diff_attachments,
+    diff_budgets,
+    diff_installments,
+    edit_change,
+    edit_installment_change,
+    remove_change,
+    remove_installment_change,
+    upgrade_changes,
+)
+from .model import COLUMN_LABELS, FORMAT_VERSION, Attachment, Budget, BudgetItem, Installment
@@ -0,0 +1,130 @@
+from dataclasses import dataclass, field
+from typing import Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .fx import RateTable
+from .model import COLUMN_LABELS
+from .money import decimals
+
+CATEGORY = COLUMN_LABELS["category"]
+ESTIMATED = COLUMN_LABELS["estimated_budget"]
+ACTUAL = COLUMN_LABELS["actual_budget"]
+CURRENCY = COLUMN_LABELS["currency"]
+PAID_BY = COLUMN_LABELS["paid_by"]
+PAYMENT_DONE = COLUMN_LABELS["payment_done"]
+
+VARIANCE = "Scostamento"
+DUE = "Importo Previsto"
+PAID = "Pagato"
+OUTSTANDING = "Da Pagare"
+ITEMS = "Voci"
+
+AMOUNT_COLUMNS = [ESTIMATED, ACTUAL, VARIANCE, DUE, PAID, OUTSTANDING]
+
+
+@dataclass
+class BudgetSummary:
+    currency: str
+    total_estimated: int
+    total_actual: int
+    variance: int
+    total_paid: int
+    outstanding: int
+    overruns: pd.DataFrame
+    by_payer: pd.DataFrame
+    by_category: pd.DataFrame
+    # Items and expected cost of the unpaid and paid items, in minor units
+    status_items: np.ndarray = field(repr=False)
+    status_due: np.ndarray = field(repr=False)
+
+    @property
+    def by_status(self) -> pd.DataFrame:
+        """
+        Items and expected cost by payment status, built when asked for since
+        the page does not show it.
+        """
+        present = self.status_items > 0
+        return pd.DataFrame(
+            {ITEMS: self.status_items[present], DUE: self.status_due[present] / 10.0 ** decimals(self.currency)},
+            index=pd.Index(np.array([False, True])[present], name=PAYMENT_DONE),
+        )
+
+
+def _group_sums(codes: np.ndarray, groups: int, *values: np.ndarray) -> list:
+    # Sums of minor units are exact in float64 below 2**53
+    return [np.bincount(codes, weights=value, minlength=groups).astype(np.int64) for value in values]
+
+
+def summarize(columns: Mapping[str, Sequence], rates: RateTable, currency: str) -> BudgetSummary:
+    """
+    Compute the budget aggregates in ``currency`` from the ``COLUMN_LABELS``
+    columns with amounts in minor units (``Budget.to_columns`` or a DataFrame
+    of it), with array operations only: groups are numbered with
+    ``pd.factorize`` and summed with ``np.bincount``, and DataFrames are only
+    built for the tables on the page.
+
+    An item's expected cost (``DUE``) is its actual amount when known and its
+    estimate otherwise; paid items count towards ``PAID``, the others towards
+    ``OUTSTANDING``. Totals are in minor units, the tables in major units.
+    """
+    currencies = np.asarray(columns[CURRENCY], dtype=object)
+    estimated = rates.convert(np.asarray(columns[ESTIMATED], dtype=np.int64), currencies, currency)
+    actual = rates.convert(np.asarray(columns[ACTUAL], dtype=np.int64), currencies, currency)
+    paid = np.asarray(columns[PAYMENT_DONE], dtype=bool)
+    # Object arrays: turning thousands of names into string arrays costs
+    # more than everything else here
+    categories = np.asarray(columns[CATEGORY], dtype=object)
+    variance = actual - estimated
+    due = np.where(actual > 0, actual, estimated)
+    paid_amount = np.where(paid, due, 0)
+    outstanding = due - paid_amount
+
+    # The tables are for reading: major units (euros, not cents), summed
+    # exactly in minor units first
+    scale = 10.0 ** decimals(currency)
+
+    payers = np.asarray(columns[PAID_BY], dtype=object)
+    # Hashed rather than sorted, only the few distinct payers get sorted
+    payer_codes, payer_names = pd.factorize(np.where(payers == "", "—", payers), sort=True)
+    payer_due, payer_paid, payer_outstanding = _group_sums(
+        payer_codes, len(payer_names), due, paid_amount, outstanding
+    )
+    by_payer = pd.DataFrame(
+        {
+            ITEMS: np.bincount(payer_codes, minlength=len(payer_names)),
+            DUE: payer_due / scale,
+            PAID: payer_paid / scale,
+            OUTSTANDING: payer_outstanding / scale,
+        },
+        index=pd.Index(payer_names, dtype=object, name=PAID_BY),
+    )
+
+    over = np.flatnonzero(variance > 0)
+    over = over[np.argsort(-variance[over], kind="stable")]
+    overruns = pd.DataFrame(
+        {
+            CATEGORY: pd.Series(categories[over], dtype=object),
+            ESTIMATED: estimated[over] / scale,
+            ACTUAL: actual[over] / scale,
+            VARIANCE: variance[over] / scale,
+        }
+    )
+
+    status_codes = paid.astype(np.intp)
+    (status_due,) = _group_sums(status_codes, 2, due)
+
+    return BudgetSummary(
+        currency=currency,
+        total_estimated=int(estimated.sum()),
+        total_actual=int(actual.sum()),
+        variance=int(variance.sum()),
+        total_paid=int(paid_amount.sum()),
+        outstanding=int(outstanding.sum()),
+        overruns=overruns,
+        by_payer=by_payer,
+        by_category=pd.DataFrame({CATEGORY: pd.Series(categories, dtype=object), ESTIMATED: estimated / scale}),
+        status_items=np.bincount(status_codes, minlength=2),
+        status_due=status_due,
+    )
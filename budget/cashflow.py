@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .fx import RateTable
+from .model import COLUMN_LABELS, Budget
+from .money import decimals
+
+CATEGORY = COLUMN_LABELS["category"]
+
+MONTH = "Mese"
+PAID = "Pagato"
+UPCOMING = "Da Pagare"
+OVERDUE = "Scaduto"
+CUMULATIVE = "Cumulato"
+DUE_DATE = "Scadenza"
+AMOUNT = "Importo"
+DAYS_OVERDUE = "Giorni di Ritardo"
+
+STATUSES = [PAID, UPCOMING, OVERDUE]
+
+
+@dataclass
+class CashFlow:
+    currency: str
+    monthly: pd.DataFrame
+    overdue: pd.DataFrame
+    total_overdue: int
+    due_next_30_days: int
+    unscheduled: int
+
+
+def schedule_frame(budget: Budget) -> pd.DataFrame:
+    """
+    Return every installment of the budget as one row, with its item's
+    category and currency, the due date as ``datetime64`` and the amount as
+    ``int64`` minor units.
+    """
+    installments = budget.installments
+    categories = {item.id: item.category for item in budget}
+    currencies = {item.id: item.currency for item in budget}
+    return pd.DataFrame(
+        {
+            "item_id": pd.Series([installment.item_id for installment in installments], dtype=object),
+            CATEGORY: pd.Series(
+                [categories.get(installment.item_id, "") for installment in installments], dtype=object
+            ),
+            "currency": pd.Series(
+                [currencies.get(installment.item_id, "") for installment in installments], dtype=object
+            ),
+            DUE_DATE: pd.to_datetime(
+                pd.Series([installment.due_date for installment in installments], dtype=object),
+                errors="coerce",
+            ),
+            AMOUNT: pd.Series([installment.amount for installment in installments], dtype="int64"),
+            "paid": pd.Series([installment.paid for installment in installments], dtype=bool),
+        }
+    )
+
+
+def project_cash_flow(budget: Budget, today: date, rates: RateTable, currency: str) -> CashFlow:
+    """
+    Project the payment schedule of the budget month by month in
+    ``currency``, with vectorized operations only.
+
+    Each month gets the amounts already paid, still to pay and overdue (due
+    before ``today`` and not paid), plus the running total of all three.
+    Months without installments in between are included with zeros.
+    ``unscheduled`` is what the unpaid items are expected to cost (actual
+    amount when known, estimate otherwise) beyond their installments.
+    Totals are in minor units of ``currency``, the tables in major units.
+    """
+    frame = schedule_frame(budget)
+    frame = frame[frame[DUE_DATE].notna()]
+    frame = frame.assign(**{AMOUNT: rates.convert(frame[AMOUNT].to_numpy(), frame["currency"], currency)})
+    today = pd.Timestamp(today)
+    paid = frame["paid"].to_numpy(dtype=bool)
+    due_dates = frame[DUE_DATE]
+    late = ~paid & (due_dates < today).to_numpy()
+
+    status = np.select([paid, late], [PAID, OVERDUE], UPCOMING)
+    months = due_dates.dt.to_period("M")
+    monthly = (
+        frame.groupby([months.rename(MONTH), status], sort=True)[AMOUNT]
+        .sum()
+        .unstack(fill_value=0)
+        .reindex(columns=STATUSES, fill_value=0)
+    )
+    if len(monthly) > 0:
+        monthly = monthly.reindex(pd.period_range(months.min(), months.max(), freq="M", name=MONTH), fill_value=0)
+    monthly = monthly.astype("int64")
+    monthly[CUMULATIVE] = monthly[STATUSES].sum(axis=1).cumsum()
+    monthly.index = monthly.index.astype(str)
+
+    overdue = frame.loc[late, [CATEGORY, DUE_DATE, AMOUNT]].sort_values(DUE_DATE)
+    overdue[DAYS_OVERDUE] = (today - overdue[DUE_DATE]).dt.days
+    overdue[DUE_DATE] = overdue[DUE_DATE].dt.date
+    upcoming = ~paid & (due_dates >= today).to_numpy() & (due_dates < today + timedelta(days=30)).to_numpy()
+
+    # What each unpaid item should cost beyond the installments planned for it
+    items = list(budget)
+    item_currencies = [item.currency for item in items]
+    estimated = rates.convert([item.estimated_budget for item in items], item_currencies, currency)
+    actual = rates.convert([item.actual_budget for item in items], item_currencies, currency)
+    done = np.fromiter((item.payment_done for item in items), dtype=bool, count=len(items))
+    scheduled = (
+        frame.groupby("item_id")[AMOUNT].sum()
+        .reindex([item.id for item in items], fill_value=0)
+        .to_numpy(dtype=np.int64)
+    )
+    expected = np.where(actual > 0, actual, estimated)
+    unscheduled = np.where(done, 0, np.clip(expected - scheduled, 0, None))
+
+    total_overdue = int(overdue[AMOUNT].sum())
+    # The tables are for reading: major units, e.g. euros and not cents
+    scale = 10.0 ** decimals(currency)
+    monthly = monthly / scale
+    overdue[AMOUNT] = overdue[AMOUNT] / scale
+
+    return CashFlow(
+        currency=currency,
+        monthly=monthly,
+        overdue=overdue.reset_index(drop=True),
+        total_overdue=total_overdue,
+        due_next_30_days=int(frame.loc[upcoming, AMOUNT].sum()),
+        unscheduled=int(unscheduled.sum()),
+    )
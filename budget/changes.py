@@ -0,0 +1,217 @@
+from typing import Iterable, List
+
+from .model import (
+    INSTALLMENT_FIELDS,
+    ITEM_FIELDS,
+    MINOR_UNITS_VERSION,
+    Attachment,
+    Budget,
+    BudgetItem,
+    Installment,
+    euros_to_cents,
+)
+
+# A change is a small JSON-serializable dict keyed by item id:
+#   {"op": "add", "id": ..., "values": {...all fields...}}
+#   {"op": "edit", "id": ..., "values": {...changed fields only...}}
+#   {"op": "remove", "id": ...}
+# or, for attachments and installments, by their own id:
+#   {"op": "attach", "id": ..., "values": {...all fields...}}
+#   {"op": "detach", "id": ...}
+#   {"op": "add_installment", "id": ..., "values": {...all fields...}}
+#   {"op": "edit_installment", "id": ..., "values": {...changed fields only...}}
+#   {"op": "remove_installment", "id": ...}
+ADD = "add"
+EDIT = "edit"
+REMOVE = "remove"
+ATTACH = "attach"
+DETACH = "detach"
+ADD_INSTALLMENT = "add_installment"
+EDIT_INSTALLMENT = "edit_installment"
+REMOVE_INSTALLMENT = "remove_installment"
+
+CREATE_OPS = (ADD, ATTACH, ADD_INSTALLMENT)
+EDIT_OPS = (EDIT, EDIT_INSTALLMENT)
+DELETE_OPS = (REMOVE, DETACH, REMOVE_INSTALLMENT)
+
+
+def upgrade_changes(changes: List[dict], version: int) -> List[dict]:
+    """
+    Return changes logged in format ``version`` (``Budget.to_dict``'s) as
+    changes of the current format.
+    """
+    if version >= MINOR_UNITS_VERSION:
+        return changes
+    return [
+        {**change, "values": euros_to_cents(change["values"])} if "values" in change else change
+        for change in changes
+    ]
+
+
+def add_change(item: BudgetItem) -> dict:
+    values = item.to_dict()
+    del values["id"]
+    return {"op": ADD, "id": item.id, "values": values}
+
+
+def edit_change(item_id: str, **values) -> dict:
+    return {"op": EDIT, "id": item_id, "values": values}
+
+
+def remove_change(item_id: str) -> dict:
+    return {"op": REMOVE, "id": item_id}
+
+
+def attach_change(attachment: Attachment) -> dict:
+    values = attachment.to_dict()
+    del values["id"]
+    return {"op": ATTACH, "id": attachment.id, "values": values}
+
+
+def detach_change(attachment_id: str) -> dict:
+    return {"op": DETACH, "id": attachment_id}
+
+
+def add_installment_change(installment: Installment) -> dict:
+    values = installment.to_dict()
+    del values["id"]
+    return {"op": ADD_INSTALLMENT, "id": installment.id, "values": values}
+
+
+def edit_installment_change(installment_id: str, **values) -> dict:
+    return {"op": EDIT_INSTALLMENT, "id": installment_id, "values": values}
+
+
+def remove_installment_change(installment_id: str) -> dict:
+    return {"op": REMOVE_INSTALLMENT, "id": installment_id}
+
+
+def apply_changes(budget: Budget, changes: Iterable[dict]) -> Budget:
+    """
+    Apply ``changes`` to ``budget`` in place and return it.
+
+    Edits and removals of items that no longer exist are dropped, so changes
+    from concurrent editors merge instead of failing.
+    """
+    for change in changes:
+        item_id = change["id"]
+        if change["op"] == ADD:
+            budget.add(item_id=item_id, **change["values"])
+        elif change["op"] == EDIT:
+            if item_id in budget:
+                budget.update(item_id, **change["values"])
+        elif change["op"] == REMOVE:
+            if item_id in budget:
+                budget.remove(item_id)
+        elif change["op"] == ATTACH:
+            if change["values"]["item_id"] in budget:
+                budget.attach(Attachment(id=item_id, **change["values"]))
+        elif change["op"] == DETACH:
+            if budget.get_attachment(item_id) is not None:
+                budget.detach(item_id)
+        elif change["op"] == ADD_INSTALLMENT:
+            if change["values"]["item_id"] in budget:
+                budget.add_installment(Installment(id=item_id, **change["values"]))
+        elif change["op"] == EDIT_INSTALLMENT:
+            if budget.get_installment(item_id) is not None:
+                budget.update_installment(item_id, **change["values"])
+        elif change["op"] == REMOVE_INSTALLMENT:
+            if budget.get_installment(item_id) is not None:
+                budget.remove_installment(item_id)
+        else:
+            raise ValueError(f"Unknown change op: {change['op']}")
+    return budget
+
+
+def diff_budgets(before: Budget, after: Budget) -> List[dict]:
+    """
+    Return the changes that turn ``before`` into ``after``.
+    """
+    changes = []
+    for item in after:
+        previous = before.get(item.id)
+        if previous is None:
+            changes.append(add_change(item))
+            continue
+        values = {
+            name: getattr(item, name)
+            for name in ITEM_FIELDS
+            if getattr(item, name) != getattr(previous, name)
+        }
+        if values:
+            changes.append(edit_change(item.id, **values))
+    for item in before:
+        if item.id not in after:
+            changes.append(remove_change(item.id))
+    return changes
+
+
+def diff_attachments(before: Budget, after: Budget) -> List[dict]:
+    """
+    Return the attach/detach changes that turn the attachments of ``before``
+    into those of ``after``. Apply them after ``diff_budgets``'s changes, so
+    the items they belong to exist.
+    """
+    changes = [
+        attach_change(attachment)
+        for attachment in after.attachments
+        if before.get_attachment(attachment.id) is None
+    ]
+    changes.extend(
+        detach_change(attachment.id)
+        for attachment in before.attachments
+        if after.get_attachment(attachment.id) is None and attachment.item_id in after
+    )
+    return changes
+
+
+def diff_installments(before: Budget, after: Budget) -> List[dict]:
+    """
+    Return the installment changes that turn the payment schedule of
+    ``before`` into that of ``after``. Apply them after ``diff_budgets``'s
+    changes, so the items they belong to exist.
+    """
+    changes = []
+    for installment in after.installments:
+        previous = before.get_installment(installment.id)
+        if previous is None:
+            changes.append(add_installment_change(installment))
+            continue
+        values = {
+            name: getattr(installment, name)
+            for name in INSTALLMENT_FIELDS
+            if getattr(installment, name) != getattr(previous, name)
+        }
+        if values:
+            changes.append(edit_installment_change(installment.id, **values))
+    changes.extend(
+        remove_installment_change(installment.id)
+        for installment in before.installments
+        if after.get_installment(installment.id) is None and installment.item_id in after
+    )
+    return changes
+
+
+def coalesce_changes(changes: Iterable[dict]) -> List[dict]:
+    """
+    Merge a sequence of changes into at most one change per item: edits are
+    folded into the preceding add or edit, and an add followed by a remove
+    (or an attach followed by a detach, ...) cancels out.
+    """
+    merged = {}
+    for change in changes:
+        item_id = change["id"]
+        current = merged.get(item_id)
+        if current is None or change["op"] in CREATE_OPS:
+            merged[item_id] = {**change, "values": dict(change.get("values", {}))}
+            if change["op"] in DELETE_OPS:
+                del merged[item_id]["values"]
+        elif change["op"] in EDIT_OPS:
+            if current["op"] not in DELETE_OPS:
+                current["values"].update(change["values"])
+        elif change["op"] in DELETE_OPS:
+            if current["op"] in CREATE_OPS:
+                del merged[item_id]
+            else:
+                merged[item_id] = {"op": change["op"], "id": item_id}
+    return list(merged.values())
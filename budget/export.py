@@ -0,0 +1,130 @@
+import csv
+import io
+from itertools import islice
+from typing import BinaryIO, Callable, Dict, Iterator, List, NamedTuple, Tuple
+
+from .model import AMOUNT_FIELDS, COLUMN_LABELS, Budget
+from .money import to_major
+
+# Export schema shared by every format: (field, column label, type).
+# Amounts are exported in major units (euros) next to their currency.
+EXPORT_SCHEMA = [
+    ("category", COLUMN_LABELS["category"], "string"),
+    ("estimated_budget", COLUMN_LABELS["estimated_budget"], "double"),
+    ("actual_budget", COLUMN_LABELS["actual_budget"], "double"),
+    ("currency", COLUMN_LABELS["currency"], "string"),
+    ("note", COLUMN_LABELS["note"], "string"),
+    ("paid_by", COLUMN_LABELS["paid_by"], "string"),
+    ("payment_done", COLUMN_LABELS["payment_done"], "bool"),
+]
+
+CHUNK_SIZE = 1000
+
+
+def iter_rows(budget: Budget) -> Iterator[Tuple]:
+    for item in budget:
+        yield tuple(
+            float(to_major(getattr(item, field), item.currency)) if field in AMOUNT_FIELDS else getattr(item, field)
+            for field, _, _ in EXPORT_SCHEMA
+        )
+
+
+def iter_chunks(budget: Budget, chunk_size: int = CHUNK_SIZE) -> Iterator[List[Tuple]]:
+    rows = iter_rows(budget)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    types = {"string": pa.string(), "double": pa.float64(), "bool": pa.bool_()}
+    return pa.schema([(label, types[kind]) for _, label, kind in EXPORT_SCHEMA])
+
+
+def _arrow_batches(budget: Budget, schema) -> Iterator:
+    import pyarrow as pa
+
+    for chunk in iter_chunks(budget):
+        columns = list(zip(*chunk))
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+            schema=schema,
+        )
+
+
+def write_csv(budget: Budget, file: BinaryIO):
+    text = io.TextIOWrapper(file, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow([label for _, label, _ in EXPORT_SCHEMA])
+    for chunk in iter_chunks(budget):
+        writer.writerows(chunk)
+    text.detach()
+
+
+def write_parquet(budget: Budget, file: BinaryIO):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema()
+    with pq.ParquetWriter(file, schema) as writer:
+        for batch in _arrow_batches(budget, schema):
+            writer.write_table(pa.Table.from_batches([batch]))
+
+
+def write_feather(budget: Budget, file: BinaryIO):
+    import pyarrow as pa
+
+    schema = _arrow_schema()
+    with pa.ipc.new_file(file, schema) as writer:
+        for batch in _arrow_batches(budget, schema):
+            writer.write_batch(batch)
+
+
+def write_xlsx(budget: Budget, file: BinaryIO):
+    from openpyxl import Workbook
+
+    # Write-only mode streams rows instead of keeping every cell in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Budget")
+    sheet.append([label for _, label, _ in EXPORT_SCHEMA])
+    for chunk in iter_chunks(budget):
+        for row in chunk:
+            sheet.append(row)
+    workbook.save(file)
+
+
+class ExportFormat(NamedTuple):
+    label: str
+    extension: str
+    mime: str
+    write: Callable[[Budget, BinaryIO], None]
+
+
+EXPORT_FORMATS: Dict[str, ExportFormat] = {
+    "csv": ExportFormat("CSV", "csv", "text/csv", write_csv),
+    "xlsx": ExportFormat(
+        "Excel",
+        "xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        write_xlsx,
+    ),
+    "parquet": ExportFormat("Parquet", "parquet", "application/vnd.apache.parquet", write_parquet),
+    "feather": ExportFormat("Feather", "feather", "application/vnd.apache.arrow.file", write_feather),
+}
+
+
+def export_budget(budget: Budget, export_format: str, file: BinaryIO):
+    """
+    Stream ``budget`` to ``file`` in ``export_format`` (a key of ``EXPORT_FORMATS``).
+    """
+    EXPORT_FORMATS[export_format].write(budget, file)
+
+
+def export_bytes(budget: Budget, export_format: str) -> bytes:
+    buffer = io.BytesIO()
+    export_budget(budget, export_format, buffer)
+    return buffer.getvalue()
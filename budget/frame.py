@@ -0,0 +1,127 @@
+from typing import List
+
+import pandas as pd
+
+from .model import (
+    AMOUNT_FIELDS,
+    COLUMN_LABELS,
+    INSTALLMENT_LABELS,
+    ITEM_FIELDS,
+    Budget,
+    BudgetItem,
+    Installment,
+    new_item_id,
+)
+from .money import DEFAULT_CURRENCY, minor_to_major, to_minor
+
+ID_COLUMN = "id"
+
+# Default for each field when a grid cell is left empty
+FIELD_DEFAULTS = {
+    "category": "",
+    "estimated_budget": 0,
+    "actual_budget": 0,
+    "currency": DEFAULT_CURRENCY,
+    "note": "",
+    "paid_by": "",
+    "payment_done": False,
+}
+
+# Amounts are converted separately, from the grid's euros to cents
+FIELD_TYPES = {
+    "category": str,
+    "currency": lambda code: str(code).strip().upper() or DEFAULT_CURRENCY,
+    "note": str,
+    "paid_by": str,
+    "payment_done": bool,
+}
+
+# Same for the payment schedule grid (the due date is required)
+INSTALLMENT_DEFAULTS = {
+    "amount": 0.0,
+    "paid": False,
+    "note": "",
+}
+
+
+def budget_to_frame(budget: Budget) -> pd.DataFrame:
+    """
+    Return the budget as a DataFrame with an ``id`` column followed by the
+    labelled columns of ``Budget.to_columns``, amounts in major units (euros,
+    not cents) of each item's currency.
+    """
+    columns = budget.to_columns()
+    currencies = columns[COLUMN_LABELS["currency"]]
+    for name in AMOUNT_FIELDS:
+        columns[COLUMN_LABELS[name]] = minor_to_major(columns[COLUMN_LABELS[name]], currencies)
+    return pd.DataFrame({ID_COLUMN: [item.id for item in budget], **columns})
+
+
+def budget_from_frame(frame: pd.DataFrame) -> Budget:
+    """
+    Inverse of ``budget_to_frame``. Rows without an id (added in the grid) get
+    a new one and empty cells get the field default.
+    """
+    items = []
+    for record in frame.to_dict("records"):
+        values = {}
+        for name in ITEM_FIELDS:
+            value = record.get(COLUMN_LABELS[name])
+            if value is None or pd.isna(value):
+                value = FIELD_DEFAULTS[name]
+            values[name] = value if name in AMOUNT_FIELDS else FIELD_TYPES[name](value)
+        for name in AMOUNT_FIELDS:
+            values[name] = to_minor(values[name], values["currency"])
+        item_id = record.get(ID_COLUMN)
+        if item_id is None or pd.isna(item_id) or item_id == "":
+            item_id = new_item_id()
+        items.append(BudgetItem(id=item_id, **values))
+    return Budget(items)
+
+
+def installments_to_frame(budget: Budget, item_id: str) -> pd.DataFrame:
+    """
+    Return the payment schedule of an item, by due date, with an ``id``
+    column followed by the ``INSTALLMENT_LABELS`` columns. Due dates are
+    ``datetime.date`` values, as the grid's date column expects, and amounts
+    are in major units of the item's currency.
+    """
+    installments = budget.installments_for(item_id)
+    currency = budget.get(item_id).currency
+    return pd.DataFrame(
+        {
+            ID_COLUMN: pd.Series([installment.id for installment in installments], dtype=object),
+            INSTALLMENT_LABELS["due_date"]: pd.to_datetime(
+                pd.Series([installment.due_date for installment in installments], dtype=object)
+            ).dt.date,
+            INSTALLMENT_LABELS["amount"]: minor_to_major(
+                [installment.amount for installment in installments], [currency] * len(installments)
+            ),
+            INSTALLMENT_LABELS["paid"]: pd.Series([installment.paid for installment in installments], dtype=bool),
+            INSTALLMENT_LABELS["note"]: pd.Series([installment.note for installment in installments], dtype=object),
+        }
+    )
+
+
+def installments_from_frame(frame: pd.DataFrame, item_id: str, currency: str) -> List[Installment]:
+    """
+    Inverse of ``installments_to_frame``. Rows without a due date are dropped,
+    rows without an id (added in the grid) get a new one.
+    """
+    installments = []
+    for record in frame.to_dict("records"):
+        due_date = record.get(INSTALLMENT_LABELS["due_date"])
+        if due_date is None or pd.isna(due_date):
+            continue
+        values = {"due_date": pd.Timestamp(due_date).date().isoformat()}
+        for name in INSTALLMENT_DEFAULTS:
+            value = record.get(INSTALLMENT_LABELS[name])
+            if value is None or pd.isna(value):
+                value = INSTALLMENT_DEFAULTS[name]
+            values[name] = type(INSTALLMENT_DEFAULTS[name])(value)
+        values["amount"] = to_minor(values["amount"], currency)
+        installment_id = record.get(ID_COLUMN)
+        if installment_id is None or pd.isna(installment_id) or installment_id == "":
+            installment_id = new_item_id()
+        installments.append(Installment(id=installment_id, item_id=item_id, **values))
+    return installments
@@ -0,0 +1,149 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .money import DEFAULT_CURRENCY, decimals
+
+logger = logging.getLogger(__name__)
+
+ECB_RATES_URL = "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml"
+
+
+class MissingRateError(ValueError):
+    """Raised when converting from a currency the rate table does not know."""
+
+    def __init__(self, currencies: List[str]):
+        super().__init__(f"No exchange rate for {', '.join(currencies)}")
+        self.currencies = currencies
+
+
+def fetch_ecb_rates(url: str = ECB_RATES_URL, timeout: float = 10.0) -> Tuple[str, Dict[str, float]]:
+    """
+    Download the European Central Bank reference rates: ``(date, {currency:
+    units per euro})``.
+    """
+    import requests
+
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    cubes = [element for element in ET.fromstring(response.content).iter() if element.tag.endswith("Cube")]
+    as_of = next(cube.get("time") for cube in cubes if cube.get("time"))
+    rates = {cube.get("currency"): float(cube.get("rate")) for cube in cubes if cube.get("currency")}
+    return as_of, rates
+
+
+class RateTable:
+    """
+    Exchange rates against ``base`` (units of each currency per unit of
+    ``base``), kept in a local JSON file so the app starts and converts
+    without any network call. Rates only change when ``refresh`` is called.
+
+    Conversion factors are computed once per target currency and table
+    version, and applied to whole columns at once.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        base: str = DEFAULT_CURRENCY,
+        fetch: Callable[[], Tuple[str, Dict[str, float]]] = fetch_ecb_rates,
+    ):
+        self.path = path
+        self.base = base
+        self.fetch = fetch
+        self.as_of: Optional[str] = None
+        self.fetched_at: Optional[float] = None
+        self.rates: Dict[str, float] = {base: 1.0}
+        self._lock = threading.Lock()
+        self._factors: Dict[str, pd.Series] = {}
+        self._read()
+
+    def _read(self):
+        try:
+            with open(self.path) as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            # A corrupt table is replaced on the next refresh
+            logger.warning("Ignoring exchange rate table %s: %s", self.path, e)
+            return
+        if data.get("base") != self.base:
+            return
+        self.as_of = data.get("as_of")
+        self.fetched_at = data.get("fetched_at")
+        self.rates = {**data.get("rates", {}), self.base: 1.0}
+
+    @property
+    def version(self) -> Tuple[Optional[str], Optional[float]]:
+        """
+        Changes whenever the rates do, for keying cached conversions.
+        """
+        return self.as_of, self.fetched_at
+
+    @property
+    def currencies(self) -> List[str]:
+        return sorted(self.rates)
+
+    def refresh(self):
+        """
+        Download the current rates and store them in the table file.
+        """
+        as_of, rates = self.fetch()
+        data = {"base": self.base, "as_of": as_of, "fetched_at": time.time(), "rates": rates}
+        # Written aside and renamed, so a reader never sees half a file
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=directory, delete=False, suffix=".tmp") as file:
+            json.dump(data, file, indent=2, sort_keys=True)
+        os.replace(file.name, self.path)
+        with self._lock:
+            self.as_of = as_of
+            self.fetched_at = data["fetched_at"]
+            self.rates = {**rates, self.base: 1.0}
+            self._factors.clear()
+
+    def factors(self, target: str) -> pd.Series:
+        """
+        Return, per source currency, the number of minor units of ``target``
+        one minor unit of the source is worth.
+        """
+        with self._lock:
+            factors = self._factors.get(target)
+            if factors is None:
+                if target not in self.rates:
+                    raise MissingRateError([target])
+                factors = pd.Series(
+                    {
+                        source: self.rates[target] / rate * 10.0 ** (decimals(target) - decimals(source))
+                        for source, rate in self.rates.items()
+                    },
+                    dtype=np.float64,
+                )
+                self._factors[target] = factors
+            return factors
+
+    def convert(self, minor, currencies, target: str) -> np.ndarray:
+        """
+        Convert amounts in minor units, each in the matching entry of
+        ``currencies``, to minor units of ``target`` (rounded to the nearest).
+        """
+        minor = np.asarray(minor, dtype=np.int64)
+        # A handful of distinct currencies: look each one up once
+        codes, sources = pd.factorize(np.asarray(currencies, dtype=object))
+        if len(sources) == 0 or (len(sources) == 1 and sources[0] == target):
+            return minor.copy()
+        table = self.factors(target)
+        missing = [source for source in sources if source not in table.index]
+        if missing:
+            raise MissingRateError(sorted(missing))
+        factors = np.array([table[source] for source in sources], dtype=np.float64)
+        return np.rint(minor * factors[codes]).astype(np.int64)
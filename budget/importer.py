@@ -0,0 +1,271 @@
+import os
+from dataclasses import dataclass, field
+from typing import BinaryIO, List, Optional
+
+import pandas as pd
+
+from .changes import (
+    ADD,
+    ADD_INSTALLMENT,
+    ATTACH,
+    DETACH,
+    EDIT,
+    EDIT_INSTALLMENT,
+    REMOVE,
+    REMOVE_INSTALLMENT,
+    add_change,
+    edit_change,
+)
+from .model import (
+    AMOUNT_FIELDS,
+    COLUMN_LABELS,
+    INSTALLMENT_LABELS,
+    ITEM_FIELDS,
+    Attachment,
+    Budget,
+    BudgetItem,
+    Installment,
+    new_item_id,
+)
+from .money import DEFAULT_CURRENCY, decimals, format_amount, is_currency_code
+
+INSTALLMENT_OPERATIONS = {
+    ADD_INSTALLMENT: "Rata aggiunta",
+    EDIT_INSTALLMENT: "Rata aggiornata",
+    REMOVE_INSTALLMENT: "Rata rimossa",
+}
+
+TEXT_FIELDS = ("category", "note", "paid_by")
+TRUE_VALUES = {"true", "1", "si", "sì", "yes", "x"}
+FALSE_VALUES = {"false", "0", "no", ""}
+
+# Labels of the exports made before amounts had a currency
+LEGACY_LABELS = {
+    "Budget Stimato (€)": "estimated_budget",
+    "Budget Reale (€)": "actual_budget",
+}
+
+
+@dataclass
+class ImportResult:
+    rows: List[dict] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+
+def read_table(file: BinaryIO, file_name: str) -> pd.DataFrame:
+    """
+    Read a CSV or Excel file into a DataFrame of strings.
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension in (".xlsx", ".xls"):
+        return pd.read_excel(file, dtype=str)
+    return pd.read_csv(file, dtype=str, keep_default_na=False)
+
+
+def _column_names(frame: pd.DataFrame) -> dict:
+    # Columns can be named with the table labels or the field names
+    aliases = {}
+    for name in ITEM_FIELDS:
+        aliases[name.casefold()] = name
+        aliases[COLUMN_LABELS[name].casefold()] = name
+    for label, name in LEGACY_LABELS.items():
+        aliases[label.casefold()] = name
+    return {
+        column: aliases[str(column).strip().casefold()]
+        for column in frame.columns
+        if str(column).strip().casefold() in aliases
+    }
+
+
+def parse_import(frame: pd.DataFrame, budget: Optional[Budget] = None) -> ImportResult:
+    """
+    Validate an imported table and return one dict of field values per row.
+
+    Only the columns present in the file end up in the rows. Every row is
+    checked: a category is required, "Valuta" must be a currency code, amounts
+    must be non-negative with no more decimals than their currency has, and
+    "Pagamento Effettuato" must be a yes/no value. Without a "Valuta" column
+    the amounts are in the currency of the category of ``budget`` with the
+    same name, or in euros for a new one. Amounts are returned in minor units
+    (cents). Nothing is returned if any row is invalid.
+    """
+    result = ImportResult()
+    frame = frame.rename(columns=_column_names(frame))
+    if "category" not in frame.columns:
+        result.errors.append(f"Colonna obbligatoria mancante: {COLUMN_LABELS['category']}")
+        return result
+
+    # Spreadsheet row numbers: 1-based, after the header
+    row_numbers = pd.Series(range(2, len(frame) + 2), index=frame.index)
+    columns = {}
+
+    for name in TEXT_FIELDS:
+        if name in frame.columns:
+            columns[name] = frame[name].fillna("").astype(str).str.strip()
+    for row in row_numbers[columns["category"] == ""]:
+        result.errors.append(f"Riga {row}: {COLUMN_LABELS['category']} mancante")
+
+    if "currency" not in frame.columns:
+        # Matched the same way as in plan_import, so the amounts are scaled
+        # for the currency they will be stored with
+        existing = {item.category.strip().casefold(): item.currency for item in budget or []}
+        currencies = columns["category"].str.casefold().map(existing).fillna(DEFAULT_CURRENCY)
+    else:
+        currencies = frame["currency"].fillna("").astype(str).str.strip().str.upper().replace("", DEFAULT_CURRENCY)
+        invalid = ~currencies.map({code: is_currency_code(code) for code in currencies.unique()}).astype(bool)
+        for row, value in zip(row_numbers[invalid], currencies[invalid]):
+            result.errors.append(f"Riga {row}: {COLUMN_LABELS['currency']} non valida ({value!r})")
+        columns["currency"] = currencies
+    places = currencies.map({code: decimals(code) for code in currencies.unique()})
+
+    for name in AMOUNT_FIELDS:
+        if name not in frame.columns:
+            continue
+        raw = frame[name].fillna("").astype(str).str.strip()
+        # Decimal comma as typed in an Italian spreadsheet
+        amounts = pd.to_numeric(raw.replace("", "0").str.replace(",", ".", regex=False), errors="coerce")
+        minor = amounts * 10.0 ** places
+        invalid = amounts.isna() | (amounts < 0) | ((minor - minor.round()).abs() > 1e-6)
+        for row, value, row_places in zip(row_numbers[invalid], raw[invalid], places[invalid]):
+            result.errors.append(
+                f"Riga {row}: {COLUMN_LABELS[name]} non valido ({value!r}), "
+                f"serve un importo non negativo con al massimo {row_places} decimali"
+            )
+        columns[name] = minor.round().fillna(0).astype("int64")
+
+    if "payment_done" in frame.columns:
+        flags = frame["payment_done"].fillna("").astype(str).str.strip().str.casefold()
+        invalid = ~flags.isin(TRUE_VALUES | FALSE_VALUES)
+        for row, value in zip(row_numbers[invalid], flags[invalid]):
+            result.errors.append(
+                f"Riga {row}: {COLUMN_LABELS['payment_done']} non valido ({value!r})"
+            )
+        columns["payment_done"] = flags.isin(TRUE_VALUES)
+
+    if result.errors:
+        return result
+    # Only the columns present in the file are imported
+    for record in pd.DataFrame(columns).to_dict("records"):
+        row = {name: record[name] for name in ITEM_FIELDS if name in record}
+        for name in AMOUNT_FIELDS:
+            if name in row:
+                row[name] = int(row[name])
+        if "payment_done" in row:
+            row["payment_done"] = bool(row["payment_done"])
+        result.rows.append(row)
+    return result
+
+
+def plan_import(budget: Budget, rows: List[dict]) -> List[dict]:
+    """
+    Return the changes that upsert ``rows`` into ``budget`` by category name
+    (case-insensitive): existing categories get an edit of the imported fields
+    that differ, new ones an add with defaults for the missing fields. When a
+    category appears twice the last row wins.
+    """
+    existing = {item.category.strip().casefold(): item for item in budget}
+    planned = {}
+    for row in rows:
+        key = row["category"].casefold()
+        item = existing.get(key)
+        if item is None:
+            planned[key] = add_change(BudgetItem(id=new_item_id(), **row))
+            continue
+        values = {
+            name: value
+            for name, value in row.items()
+            if name != "category" and getattr(item, name) != value
+        }
+        planned[key] = edit_change(item.id, **values) if values else None
+    return [change for change in planned.values() if change is not None]
+
+
+def _format_value(name: str, value, currency: str) -> str:
+    return format_amount(value, currency) if name in AMOUNT_FIELDS or name == "amount" else str(value)
+
+
+def describe_changes(budget: Budget, changes: List[dict]) -> pd.DataFrame:
+    """
+    Dry-run preview: one row per change with the old and new values, as they
+    apply to ``budget``. Also used to show past changes in the history.
+    """
+    rows = []
+    for change in changes:
+        if change["op"] in (ATTACH, DETACH):
+            if change["op"] == ATTACH:
+                attachment = Attachment(id=change["id"], **change["values"])
+            else:
+                attachment = budget.get_attachment(change["id"])
+            item = budget.get(attachment.item_id) if attachment is not None else None
+            if item is None:
+                continue
+            rows.append(
+                {
+                    "Operazione": "Allegato aggiunto" if change["op"] == ATTACH else "Allegato rimosso",
+                    COLUMN_LABELS["category"]: item.category,
+                    "Modifiche": attachment.name,
+                }
+            )
+            continue
+        if change["op"] in INSTALLMENT_OPERATIONS:
+            installment = budget.get_installment(change["id"])
+            if change["op"] == ADD_INSTALLMENT:
+                installment = Installment(id=change["id"], **change["values"])
+            item = budget.get(installment.item_id) if installment is not None else None
+            if item is None:
+                continue
+            if change["op"] == EDIT_INSTALLMENT:
+                details = ", ".join(
+                    f"{INSTALLMENT_LABELS[name]}: "
+                    f"{_format_value(name, getattr(installment, name), item.currency)} → "
+                    f"{_format_value(name, value, item.currency)}"
+                    for name, value in change["values"].items()
+                )
+            else:
+                details = f"{installment.due_date}: {format_amount(installment.amount, item.currency)}"
+            rows.append(
+                {
+                    "Operazione": INSTALLMENT_OPERATIONS[change["op"]],
+                    COLUMN_LABELS["category"]: item.category,
+                    "Modifiche": details,
+                }
+            )
+            continue
+        item = budget.get(change["id"])
+        if change["op"] != ADD and item is None:
+            # Item already removed by someone else, the change had no effect
+            continue
+        if change["op"] == ADD:
+            rows.append(
+                {
+                    "Operazione": "Nuova",
+                    COLUMN_LABELS["category"]: change["values"]["category"],
+                    "Modifiche": ", ".join(
+                        f"{COLUMN_LABELS[name]}: "
+                        f"{_format_value(name, value, change['values'].get('currency', DEFAULT_CURRENCY))}"
+                        for name, value in change["values"].items()
+                        if name != "category"
+                    ),
+                }
+            )
+        elif change["op"] == EDIT:
+            rows.append(
+                {
+                    "Operazione": "Aggiornata",
+                    COLUMN_LABELS["category"]: item.category,
+                    "Modifiche": ", ".join(
+                        f"{COLUMN_LABELS[name]}: {_format_value(name, getattr(item, name), item.currency)} → "
+                        f"{_format_value(name, value, change['values'].get('currency', item.currency))}"
+                        for name, value in change["values"].items()
+                    ),
+                }
+            )
+        elif change["op"] == REMOVE:
+            rows.append(
+                {
+                    "Operazione": "Rimossa",
+                    COLUMN_LABELS["category"]: item.category,
+                    "Modifiche": "",
+                }
+            )
+    return pd.DataFrame(rows, columns=["Operazione", COLUMN_LABELS["category"], "Modifiche"])
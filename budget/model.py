@@ -0,0 +1,314 @@
+import uuid
+from dataclasses import asdict, dataclass, fields, replace
+from itertools import zip_longest
+from operator import attrgetter
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .money import DEFAULT_CURRENCY
+
+# Legacy documents stored the budget as parallel lists, one per field
+LEGACY_FIELDS = {
+    "categories": "category",
+    "estimated_budgets": "estimated_budget",
+    "actual_budgets": "actual_budget",
+    "notes": "note",
+    "paid_by": "paid_by",
+    "payment_done": "payment_done",
+}
+
+# Column labels shown in the table and used by exports, in display order
+COLUMN_LABELS = {
+    "category": "Categoria",
+    "estimated_budget": "Budget Stimato",
+    "actual_budget": "Budget Reale",
+    "currency": "Valuta",
+    "note": "Note",
+    "paid_by": "Pagato Da",
+    "payment_done": "Pagamento Effettuato",
+}
+
+# Amounts are whole minor units (cents) of the item's currency; before
+# version 3 they were whole euros
+AMOUNT_FIELDS = ("estimated_budget", "actual_budget")
+FORMAT_VERSION = 3
+MINOR_UNITS_VERSION = 3
+
+
+def new_item_id() -> str:
+    return uuid.uuid4().hex
+
+
+def euros_to_cents(values: dict) -> dict:
+    """
+    Return item or installment ``values`` saved before ``MINOR_UNITS_VERSION``
+    with their whole euro amounts in cents.
+    """
+    return {
+        name: int(value or 0) * 100 if name in AMOUNT_FIELDS or name == "amount" else value
+        for name, value in values.items()
+    }
+
+
+@dataclass(slots=True)
+class BudgetItem:
+    id: str
+    category: str
+    estimated_budget: int = 0
+    actual_budget: int = 0
+    currency: str = DEFAULT_CURRENCY
+    note: str = ""
+    paid_by: str = ""
+    payment_done: bool = False
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BudgetItem":
+        return cls(
+            id=str(data["id"]),
+            category=data.get("category") or "",
+            estimated_budget=int(data.get("estimated_budget") or 0),
+            actual_budget=int(data.get("actual_budget") or 0),
+            currency=data.get("currency") or DEFAULT_CURRENCY,
+            note=data.get("note") or "",
+            paid_by=data.get("paid_by") or "",
+            payment_done=bool(data.get("payment_done")),
+        )
+
+
+ITEM_FIELDS = tuple(f.name for f in fields(BudgetItem) if f.name != "id")
+
+# Plain tuple of an item's values; unlike dataclasses.astuple it does not
+# deep-copy anything, so hashing a whole budget stays cheap
+_item_values = attrgetter("id", *ITEM_FIELDS)
+
+
+@dataclass(slots=True)
+class Attachment:
+    """
+    Reference to a file (receipt, contract, ...) attached to an item. The file
+    itself is a separate encrypted object, see ``store.attachments``.
+    """
+    id: str
+    item_id: str
+    name: str
+    mime: str = "application/octet-stream"
+    size: int = 0
+    thumbnail: bool = False
+    uploaded_by: str = ""
+    uploaded_at: float = 0.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Attachment":
+        return cls(**{f.name: data[f.name] for f in fields(cls) if f.name in data})
+
+
+@dataclass(slots=True)
+class Installment:
+    """
+    A dated payment (deposit, installment, balance) towards an item, in
+    minor units of the item's currency. ``due_date`` is an ISO date,
+    ``YYYY-MM-DD``.
+    """
+    id: str
+    item_id: str
+    due_date: str
+    amount: int = 0
+    paid: bool = False
+    note: str = ""
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Installment":
+        return cls(
+            id=str(data["id"]),
+            item_id=str(data["item_id"]),
+            due_date=str(data["due_date"]),
+            amount=int(data.get("amount") or 0),
+            paid=bool(data.get("paid")),
+            note=data.get("note") or "",
+        )
+
+
+INSTALLMENT_FIELDS = tuple(f.name for f in fields(Installment) if f.name not in ("id", "item_id"))
+
+_installment_values = attrgetter("id", "item_id", *INSTALLMENT_FIELDS)
+
+# Column labels of the payment schedule table
+INSTALLMENT_LABELS = {
+    "due_date": "Scadenza",
+    "amount": "Importo",
+    "paid": "Pagata",
+    "note": "Note",
+}
+
+
+class Budget:
+    """
+    Ordered collection of budget items with stable ids and O(1) lookup by id.
+
+    ``to_dict``/``from_dict`` are the only (de)serialization path; the table,
+    the exports and the storage format are all derived from them.
+    """
+
+    def __init__(
+        self,
+        items: Iterable[BudgetItem] = (),
+        attachments: Iterable[Attachment] = (),
+        installments: Iterable[Installment] = (),
+    ):
+        self._items: Dict[str, BudgetItem] = {item.id: item for item in items}
+        self._attachments: Dict[str, Attachment] = {
+            attachment.id: attachment for attachment in attachments
+        }
+        self._installments: Dict[str, Installment] = {
+            installment.id: installment for installment in installments
+        }
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[BudgetItem]:
+        return iter(self._items.values())
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._items
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Budget) and list(self) == list(other)
+
+    def get(self, item_id: str) -> Optional[BudgetItem]:
+        return self._items.get(item_id)
+
+    def add(self, category: str, item_id: Optional[str] = None, **values) -> BudgetItem:
+        item = BudgetItem(id=item_id or new_item_id(), category=category, **values)
+        self._items[item.id] = item
+        return item
+
+    def update(self, item_id: str, **values) -> BudgetItem:
+        item = self._items[item_id]
+        for name, value in values.items():
+            if name not in ITEM_FIELDS:
+                raise AttributeError(f"BudgetItem has no field '{name}'")
+            setattr(item, name, value)
+        return item
+
+    def remove(self, item_id: str) -> BudgetItem:
+        for attachment in self.attachments_for(item_id):
+            del self._attachments[attachment.id]
+        for installment in self.installments_for(item_id):
+            del self._installments[installment.id]
+        return self._items.pop(item_id)
+
+    @property
+    def attachments(self) -> List[Attachment]:
+        return list(self._attachments.values())
+
+    def attachments_for(self, item_id: str) -> List[Attachment]:
+        return [attachment for attachment in self._attachments.values() if attachment.item_id == item_id]
+
+    def get_attachment(self, attachment_id: str) -> Optional[Attachment]:
+        return self._attachments.get(attachment_id)
+
+    def attach(self, attachment: Attachment) -> Attachment:
+        self._attachments[attachment.id] = attachment
+        return attachment
+
+    def detach(self, attachment_id: str) -> Attachment:
+        return self._attachments.pop(attachment_id)
+
+    @property
+    def installments(self) -> List[Installment]:
+        return list(self._installments.values())
+
+    def installments_for(self, item_id: str) -> List[Installment]:
+        return sorted(
+            (installment for installment in self._installments.values() if installment.item_id == item_id),
+            key=lambda installment: installment.due_date,
+        )
+
+    def get_installment(self, installment_id: str) -> Optional[Installment]:
+        return self._installments.get(installment_id)
+
+    def add_installment(self, installment: Installment) -> Installment:
+        self._installments[installment.id] = installment
+        return installment
+
+    def update_installment(self, installment_id: str, **values) -> Installment:
+        installment = self._installments[installment_id]
+        for name, value in values.items():
+            if name not in INSTALLMENT_FIELDS:
+                raise AttributeError(f"Installment has no field '{name}'")
+            setattr(installment, name, value)
+        return installment
+
+    def remove_installment(self, installment_id: str) -> Installment:
+        return self._installments.pop(installment_id)
+
+    def fingerprint(self) -> int:
+        """
+        Content hash of the budget, for keying per-version caches and widgets.
+        Compute it once per rerun and pass it down, it walks every item.
+        """
+        return hash(tuple(map(_item_values, self._items.values())))
+
+    def schedule_fingerprint(self) -> int:
+        """
+        Content hash of the installments. The cash-flow projection also
+        depends on the items, so it is keyed by both fingerprints.
+        """
+        return hash(tuple(map(_installment_values, self._installments.values())))
+
+    def copy(self) -> "Budget":
+        return Budget(
+            (replace(item) for item in self),
+            (replace(attachment) for attachment in self._attachments.values()),
+            (replace(installment) for installment in self._installments.values()),
+        )
+
+    def to_columns(self) -> Dict[str, List]:
+        """
+        Return the budget as ``{column label: values}``, ready for a DataFrame.
+        """
+        items = list(self)
+        return {
+            label: [getattr(item, name) for item in items]
+            for name, label in COLUMN_LABELS.items()
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "version": FORMAT_VERSION,
+            "items": [item.to_dict() for item in self],
+            "attachments": [attachment.to_dict() for attachment in self._attachments.values()],
+            "installments": [installment.to_dict() for installment in self._installments.values()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "Budget":
+        if not data:
+            return cls()
+        # Documents without a version are the legacy lists, in euros too
+        upgrade = euros_to_cents if data.get("version", 1) < MINOR_UNITS_VERSION else dict
+        if "items" in data:
+            return cls(
+                (BudgetItem.from_dict(upgrade(item)) for item in data["items"]),
+                (Attachment.from_dict(attachment) for attachment in data.get("attachments", ())),
+                (Installment.from_dict(upgrade(installment)) for installment in data.get("installments", ())),
+            )
+
+        # Legacy parallel lists: pad short lists with defaults and derive
+        # ids from the position so they stay stable until the next save
+        columns = [data.get(key, []) for key in LEGACY_FIELDS]
+        items = []
+        for index, values in enumerate(zip_longest(*columns)):
+            item = dict(zip(LEGACY_FIELDS.values(), values))
+            item["id"] = f"legacy-{index}"
+            items.append(BudgetItem.from_dict(upgrade(item)))
+        return cls(items)
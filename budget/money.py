@@ -0,0 +1,52 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import TYPE_CHECKING, Union
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_CURRENCY = "EUR"
+
+# Currencies without cents; every other one has two decimals
+ZERO_DECIMAL_CURRENCIES = {"CLP", "ISK", "JPY", "KRW", "PYG", "UGX", "VND", "XAF", "XOF"}
+
+
+def decimals(currency: str) -> int:
+    return 0 if currency in ZERO_DECIMAL_CURRENCIES else 2
+
+
+def is_currency_code(code: str) -> bool:
+    return len(code) == 3 and code.isascii() and code.isalpha() and code.isupper()
+
+
+def to_minor(amount: Union[int, float, str, Decimal], currency: str) -> int:
+    """
+    Return ``amount`` (in euros, dollars, ...) as an exact number of minor
+    units (cents), rounding half up. Floats go through their shortest repr,
+    so 12.34 from a form is 1234 cents and not 1233.
+    """
+    try:
+        value = Decimal(str(amount))
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {amount!r}") from None
+    return int((value * 10 ** decimals(currency)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_major(minor: int, currency: str) -> Decimal:
+    return Decimal(minor).scaleb(-decimals(currency))
+
+
+def format_amount(minor: int, currency: str) -> str:
+    return f"{to_major(minor, currency):,.{decimals(currency)}f} {currency}"
+
+
+def minor_to_major(minor, currencies) -> "np.ndarray":
+    """
+    Vectorized ``to_major`` as floats, for tables and charts: ``currencies``
+    holds the currency of each amount.
+    """
+    import numpy as np
+    import pandas as pd
+
+    codes = pd.Series(currencies, dtype=object)
+    scales = codes.map({code: 10.0 ** decimals(code) for code in codes.unique()})
+    return np.asarray(minor, dtype=np.float64) / scales.to_numpy(dtype=np.float64)
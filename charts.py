@@ -0,0 +1,115 @@
+import io
+
+import streamlit as st
+
+CHART_TITLE = "Distribuzione Budget Stimato ({currency})"
+
+
+@st.cache_data(max_entries=32)
+def estimated_budget_pie_png(categories: tuple, estimated_budgets: tuple, currency: str) -> bytes:
+    """
+    Render the pie chart once per distinct ``(categories, estimated_budgets,
+    currency)``.
+
+    The figure is built with the object-oriented API, so it is never
+    registered with pyplot and is freed as soon as the PNG is written.
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(8, 8))
+    ax = fig.subplots()
+    ax.pie(
+        estimated_budgets,
+        labels=categories,
+        autopct="%1.1f%%",
+        startangle=140,
+    )
+    ax.set_title(CHART_TITLE.format(currency=currency))
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    fig.clear()
+    return buffer.getvalue()
+
+
+@st.cache_data(max_entries=32)
+def estimated_budget_pie_spec(categories: tuple, estimated_budgets: tuple, currency: str) -> dict:
+    """
+    Vega-Lite spec of the same chart, rendered as vector graphics in the browser.
+    """
+    return {
+        "title": CHART_TITLE.format(currency=currency),
+        "data": {
+            "values": [
+                {"Categoria": category, "Budget Stimato": budget}
+                for category, budget in zip(categories, estimated_budgets)
+            ]
+        },
+        "mark": {"type": "arc", "tooltip": True},
+        "encoding": {
+            "theta": {"field": "Budget Stimato", "type": "quantitative", "stack": True},
+            "color": {"field": "Categoria", "type": "nominal"},
+        },
+        "view": {"stroke": None},
+    }
+
+
+def show_estimated_budget_chart(summary, mode: str = "png"):
+    """
+    Show the estimated budget distribution in the summary's currency (see
+    ``budget.analytics.summarize``), as a cached PNG (``"png"``) or as a
+    native Vega-Lite chart (``"vega"``).
+    """
+    from budget.analytics import CATEGORY, ESTIMATED
+
+    categories = tuple(summary.by_category[CATEGORY])
+    estimated_budgets = tuple(summary.by_category[ESTIMATED])
+    # matplotlib cannot draw a pie whose wedges are all zero
+    if not any(estimated_budgets):
+        st.info("Nessun budget stimato da mostrare.")
+        return
+    if mode == "vega":
+        st.vega_lite_chart(
+            estimated_budget_pie_spec(categories, estimated_budgets, summary.currency),
+            use_container_width=True,
+        )
+    else:
+        st.image(estimated_budget_pie_png(categories, estimated_budgets, summary.currency))
+
+
+def cash_flow_spec(monthly, currency: str) -> dict:
+    """
+    Vega-Lite spec of the monthly cash flow: one stacked bar per month (paid,
+    to pay, overdue) with the running total as a line on top.
+    """
+    from budget.cashflow import CUMULATIVE, MONTH, STATUSES
+
+    return {
+        "title": f"Flusso di Cassa Mensile ({currency})",
+        "data": {"values": monthly.reset_index().to_dict("records")},
+        "encoding": {"x": {"field": MONTH, "type": "ordinal"}},
+        "layer": [
+            {
+                "transform": [{"fold": STATUSES, "as": ["Stato", "Importo"]}],
+                "mark": {"type": "bar", "tooltip": True},
+                "encoding": {
+                    "y": {"field": "Importo", "type": "quantitative"},
+                    "color": {
+                        "field": "Stato",
+                        "type": "nominal",
+                        "scale": {"domain": STATUSES, "range": ["#59a14f", "#4e79a7", "#e15759"]},
+                    },
+                },
+            },
+            {
+                "mark": {"type": "line", "point": True, "color": "#f28e2b", "tooltip": True},
+                "encoding": {"y": {"field": CUMULATIVE, "type": "quantitative"}},
+            },
+        ],
+    }
+
+
+def show_cash_flow_chart(cash_flow):
+    """
+    Show the monthly cash flow computed by ``budget.cashflow.project_cash_flow``.
+    """
+    st.vega_lite_chart(cash_flow_spec(cash_flow.monthly, cash_flow.currency), use_container_width=True)
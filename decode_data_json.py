@@ -1,22 +1,20 @@
 import json
-from cryptography.fernet import Fernet
 import streamlit as st
 
+from store.envelope import envelope_from_secrets
+
 # Path to the encrypted data.json file
 ENCRYPTED_FILE_PATH = "data.json"
 
-# Load the encryption key from secrets.toml
-ENCRYPTION_KEY = st.secrets["encryption"]["key"]
-
-# Initialize Fernet with the encryption key
-fernet = Fernet(ENCRYPTION_KEY.encode())
+# Load the encryption keys (current and previous) from secrets.toml
+envelope = envelope_from_secrets(st.secrets)
 
 def decrypt_data(encrypted_data):
     """
-    Decrypt the encrypted data using the Fernet encryption key.
+    Decrypt the encrypted data, in any envelope version or the legacy
+    plain Fernet format.
     """
-    decrypted_data = fernet.decrypt(encrypted_data).decode("utf-8")
-    return json.loads(decrypted_data)
+    return envelope.decrypt_json(encrypted_data)
 
 def decode_data_file(file_path):
     """
@@ -0,0 +1,91 @@
+import argparse
+import streamlit as st
+
+from budget import Budget
+from budget.importer import describe_changes, parse_import, plan_import, read_table
+from store import DEFAULT_BUDGET_ID, BudgetIndex, DocumentStore, create_backend
+from store.envelope import envelope_from_secrets
+
+# Load the encryption keys (current and previous) from secrets.toml
+envelope = envelope_from_secrets(st.secrets)
+
+def find_budget(budget_index, budget):
+    """
+    Return the id of the budget with id or name ``budget`` (case-insensitive),
+    or None if there is not exactly one.
+    """
+    entries = budget_index.entries()
+    if budget in entries:
+        return budget
+    matches = [budget_id for budget_id, entry in entries.items() if entry["name"].casefold() == budget.casefold()]
+    return matches[0] if len(matches) == 1 else None
+
+def import_file(file_path, budget=DEFAULT_BUDGET_ID, author=None, dry_run=False):
+    """
+    Upsert the categories in a CSV/Excel file into ``budget`` (id or name),
+    by category name, as a single change log entry on behalf of ``author``.
+    Return False if the file is invalid or the budget does not exist.
+    """
+    with open(file_path, "rb") as file:
+        table = read_table(file, file_path)
+
+    backend = create_backend(st.secrets)
+    storage = st.secrets.get("storage", {})
+    budget_index = BudgetIndex(
+        backend,
+        storage.get("index_name", "index.json"),
+        encrypt=envelope.encrypt_json,
+        decrypt=envelope.decrypt_json,
+        default_document=st.secrets.get("gcs", {}).get("file_name", "data.json"),
+    )
+    budget_id = find_budget(budget_index, budget)
+    if budget_id is None:
+        print(f"No single budget named {budget!r}, choose one of:")
+        for other_id, entry in sorted(budget_index.entries().items()):
+            print(f"  {other_id}  {entry['name']}")
+        return False
+
+    # Same settings as the app, so compactions are recorded in the index
+    document_store = DocumentStore(
+        backend,
+        budget_index.entries()[budget_id]["document"],
+        encrypt=envelope.encrypt_json,
+        decrypt=envelope.decrypt_json,
+        compact_every=int(storage.get("compact_every", 20)),
+        on_compact=lambda generation: budget_index.record_generation(budget_id, generation),
+    )
+    budget = document_store.load()
+    if budget is None:
+        budget = Budget()
+
+    # Amounts without a currency column are in the matched category's currency
+    result = parse_import(table, budget)
+    if result.errors:
+        print("The file contains errors, nothing was imported:")
+        for error in result.errors:
+            print(f"  {error}")
+        return False
+
+    changes = plan_import(budget, result.rows)
+    if not changes:
+        print("No changes to import.")
+        return True
+    print(describe_changes(budget, changes).to_string(index=False))
+    if dry_run:
+        print(f"Dry run: {len(changes)} changes not saved.")
+        return True
+
+    document_store.append(changes, author=author)
+    print(f"Imported {len(changes)} changes into {budget_index.entries()[budget_id]['name']}.")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import budget categories from CSV or Excel.")
+    parser.add_argument("file", help="CSV or Excel file to import")
+    parser.add_argument("--budget", default=DEFAULT_BUDGET_ID, help="id or name of the budget (default: the original one)")
+    parser.add_argument("--author", help="email recorded as the author of the import in the history")
+    parser.add_argument("--dry-run", action="store_true", help="show the changes without saving them")
+    args = parser.parse_args()
+
+    if not import_file(args.file, budget=args.budget, author=args.author, dry_run=args.dry_run):
+        raise SystemExit(1)
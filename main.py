@@ -1,152 +1,412 @@
-import streamlit as st
-import matplotlib.pyplot as plt
-import pandas as pd
+import time
+from datetime import date
+
+# Measured first so the rerun timing report includes the imports below
+rerun_started = time.perf_counter()
+
 import json
 import os
-import math
-import webbrowser
+import streamlit as st
 from dotenv import load_dotenv
 from auth import Authenticator
-from cryptography.fernet import Fernet
-from google.cloud import storage
-from google.oauth2.service_account import Credentials
-
-# Google OAuth credentials
-os.environ['ALLOWED_USERS'] = st.secrets["google_oauth_credentials"]["allowed_users"]
-GOOGLE_CLIENT_ID = st.secrets["google_oauth_credentials"]["google_client_id"]
-GOOGLE_CLIENT_SECRET = st.secrets["google_oauth_credentials"]["google_client_secret"]
-os.environ['REDIRECT_URI'] = st.secrets["google_oauth_credentials"]["redirect_uri"]
-os.environ['TOKEN_KEY'] = st.secrets["google_oauth_credentials"]["token_key"]
-
-load_dotenv()
-
-allowed_users = os.getenv("ALLOWED_USERS").split(",")
-redirect_uri = os.environ.get("REDIRECT_URI", "http://localhost:8501/")
-
-# File path to store categories and values in JSON format
-FILE_PATH = st.secrets["data"]["file_path"]
-
-CLIENT_CONFIG = {'web': {
-    'client_id': st.secrets["google_oauth_credentials"]["google_client_id"],
-    'project_id': st.secrets["google_oauth_credentials"]["project_id"],
-    'auth_uri': 'https://accounts.google.com/o/oauth2/auth',
-    'token_uri': 'https://oauth2.googleapis.com/token',
-    'auth_provider_x509_cert_url': 'https://www.googleapis.com/oauth2/v1/certs',
-    'client_secret':  st.secrets["google_oauth_credentials"]["google_client_secret"],
-    'redirect_uris': ["http://localhost:8501/","https://borgiarini.streamlit.app"]}}
-
-authenticator = Authenticator(
-    allowed_users=allowed_users,
-    token_key=os.getenv("TOKEN_KEY"),
-    client_config=CLIENT_CONFIG,
-    redirect_uri=redirect_uri,
+from charts import show_cash_flow_chart, show_estimated_budget_chart
+from budget import (
+    COLUMN_LABELS,
+    Budget,
+    add_change,
+    apply_changes,
+    attach_change,
+    detach_change,
+    diff_budgets,
+    diff_installments,
+)
+from budget.money import DEFAULT_CURRENCY, format_amount, to_minor
+from store import (
+    AttachmentStore,
+    BudgetIndex,
+    DocumentStore,
+    History,
+    LocalFileBackend,
+    LocalSnapshot,
+    ReadCache,
+    Version,
+    WriteBehindQueue,
+    create_backend,
 )
-authenticator.check_auth()
-authenticator.login()
-
-# Load the encryption key from secrets or environment variables
-ENCRYPTION_KEY = st.secrets["encryption"]["key"]
-
-# Initialize Fernet with the encryption key
-fernet = Fernet(ENCRYPTION_KEY.encode())
-
-# Construct the service account key dictionary from st.secrets
-service_account_info = {
-    "type": st.secrets["google_credentials"]["type"],
-    "project_id": st.secrets["google_credentials"]["project_id"],
-    "private_key_id": st.secrets["google_credentials"]["private_key_id"],
-    "private_key": st.secrets["google_credentials"]["private_key"].replace("\\n", "\n"),
-    "client_email": st.secrets["google_credentials"]["client_email"],
-    "client_id": st.secrets["google_credentials"]["client_id"],
-    "auth_uri": st.secrets["google_credentials"]["auth_uri"],
-    "token_uri": st.secrets["google_credentials"]["token_uri"],
-    "auth_provider_x509_cert_url": st.secrets["google_credentials"]["auth_provider_x509_cert_url"],
-    "client_x509_cert_url": st.secrets["google_credentials"]["client_x509_cert_url"]
-}
-
-# Create credentials from the service account key
-credentials = Credentials.from_service_account_info(service_account_info)
-storage_client = storage.Client(credentials=credentials, project=service_account_info["project_id"])
-
-# Initialize the Google Cloud Storage client
-GCS_BUCKET_NAME = st.secrets["gcs"]["bucket_name"]
-GCS_FILE_NAME = st.secrets["gcs"]["file_name"]
-
-bucket = storage_client.bucket(GCS_BUCKET_NAME)
-blob = bucket.blob(GCS_FILE_NAME)
-
-# Function to encrypt data
+from store.envelope import envelope_from_secrets
+from tracing import TracedBackend, enable_trace_log, export_trace, span, start_trace, traced
+
+# Timed spans of this rerun, shown in the profiling panel and logged as JSON
+tracer = start_trace(started=rerun_started)
+
+# Build time of each cached resource below, recorded once per process
+@st.cache_resource
+def get_bootstrap_timings():
+    return {}
+
+# Function to build a resource and record how long it took
+def timed_build(name, build):
+    started = time.perf_counter()
+    resource = build()
+    get_bootstrap_timings()[name] = time.perf_counter() - started
+    return resource
+
+# App configuration, read from st.secrets (and .env) once per process
+@st.cache_resource
+def get_app_config():
+    def build():
+        # Google OAuth credentials
+        oauth_credentials = st.secrets["google_oauth_credentials"]
+        os.environ['ALLOWED_USERS'] = oauth_credentials["allowed_users"]
+        os.environ['REDIRECT_URI'] = oauth_credentials["redirect_uri"]
+        os.environ['TOKEN_KEY'] = oauth_credentials["token_key"]
+
+        load_dotenv()
+
+        tracing_config = dict(st.secrets.get("tracing", {}))
+        if tracing_config.get("log", False):
+            enable_trace_log()
+
+        return {
+            "allowed_users": os.getenv("ALLOWED_USERS").split(","),
+            "redirect_uri": os.environ.get("REDIRECT_URI", "http://localhost:8501/"),
+            "token_key": os.getenv("TOKEN_KEY"),
+            "client_config": {'web': {
+                'client_id': oauth_credentials["google_client_id"],
+                'project_id': oauth_credentials["project_id"],
+                'auth_uri': 'https://accounts.google.com/o/oauth2/auth',
+                'token_uri': 'https://oauth2.googleapis.com/token',
+                'auth_provider_x509_cert_url': 'https://www.googleapis.com/oauth2/v1/certs',
+                'client_secret': oauth_credentials["google_client_secret"],
+                'redirect_uris': ["http://localhost:8501/","https://borgiarini.streamlit.app"]}},
+            # Name of the encrypted budget document in the storage backend
+            "file_name": st.secrets.get("gcs", {}).get("file_name", "data.json"),
+            "storage": dict(st.secrets.get("storage", {})),
+            "cache_ttl_seconds": float(st.secrets.get("cache", {}).get("ttl_seconds", 5)),
+            # "png" (cached matplotlib image) or "vega" (native vector chart)
+            "chart_mode": st.secrets.get("charts", {}).get("mode", "png"),
+            # JSON trace logging and the profiling panel are both opt-in
+            "tracing": tracing_config,
+            # Display currency and the local exchange rate table
+            "currency": dict(st.secrets.get("currency", {})),
+        }
+
+    return timed_build("config", build)
+
+config = get_app_config()
+GCS_FILE_NAME = config["file_name"]
+
+# Authenticator, shared by all sessions (its state lives in st.session_state)
+@st.cache_resource
+def get_authenticator():
+    return timed_build(
+        "authenticator",
+        lambda: Authenticator(
+            allowed_users=config["allowed_users"],
+            token_key=config["token_key"],
+            client_config=config["client_config"],
+            redirect_uri=config["redirect_uri"],
+        ),
+    )
+
+authenticator = get_authenticator()
+with span("auth.check_auth"):
+    authenticator.check_auth()
+with span("auth.login"):
+    authenticator.login()
+
+# Encryption envelope from secrets: current key plus any keys being rotated out
+@st.cache_resource
+def get_envelope():
+    return timed_build("envelope", lambda: envelope_from_secrets(st.secrets))
+
+envelope = get_envelope()
+
+# Storage backend chosen from the [storage] secrets section (GCS by default).
+# The GCS credentials and client are only built on first use. Every call is
+# timed in the rerun's trace.
+@st.cache_resource
+def get_storage_backend():
+    return timed_build("storage_backend", lambda: TracedBackend(create_backend(st.secrets)))
+
+backend = get_storage_backend()
+
+# Function to encrypt data (compressed, versioned envelope)
 def encrypt_data(data):
-    json_data = json.dumps(data).encode("utf-8")
-    encrypted_data = fernet.encrypt(json_data)
-    return encrypted_data
+    with span("encrypt") as current:
+        encrypted_data = envelope.encrypt_json(data)
+        current.set(bytes=len(encrypted_data))
+        return encrypted_data
 
-# Function to decrypt data
+# Function to decrypt data, in any envelope version or the legacy format
 def decrypt_data(encrypted_data):
-    decrypted_data = fernet.decrypt(encrypted_data).decode("utf-8")
-    return json.loads(decrypted_data)
+    with span("decrypt", bytes=len(encrypted_data)):
+        return envelope.decrypt_json(encrypted_data)
+
+# Index of the budgets in the backend, shared by all sessions: listing
+# budgets only reads this small object
+@st.cache_resource
+def get_budget_index():
+    return timed_build(
+        "budget_index",
+        lambda: BudgetIndex(
+            backend,
+            config["storage"].get("index_name", "index.json"),
+            encrypt=encrypt_data,
+            decrypt=decrypt_data,
+            default_document=GCS_FILE_NAME,
+            cache=ReadCache(ttl_seconds=config["cache_ttl_seconds"]),
+        ),
+    )
+
+budget_index = get_budget_index()
+
+# Encrypted local copy of a budget, served at startup and while GCS is
+# unreachable. Only useful in front of a remote backend.
+def get_local_snapshot(document_name):
+    local_cache_dir = config["storage"].get("local_cache_dir", ".budget_cache")
+    if config["storage"].get("backend", "gcs") != "gcs" or not local_cache_dir:
+        return None
+    return LocalSnapshot(
+        LocalFileBackend(local_cache_dir),
+        document_name,
+        encrypt=encrypt_data,
+        decrypt=decrypt_data,
+    )
+
+# Process-wide document store per budget: snapshot plus change log, behind a
+# read cache so a rerun costs at most one metadata check
+@st.cache_resource
+def get_document_store(budget_id, document_name):
+    return DocumentStore(
+        backend,
+        document_name,
+        encrypt=encrypt_data,
+        decrypt=decrypt_data,
+        cache=ReadCache(ttl_seconds=config["cache_ttl_seconds"]),
+        compact_every=int(config["storage"].get("compact_every", 20)),
+        on_compact=lambda generation: budget_index.record_generation(budget_id, generation),
+        local_snapshot=get_local_snapshot(document_name),
+    )
+
+# Exchange rates, shared by all sessions and read from a local file: nothing
+# is downloaded until someone asks for a refresh
+@st.cache_resource
+def get_rate_table():
+    def build():
+        from functools import partial
+
+        from budget.fx import ECB_RATES_URL, RateTable, fetch_ecb_rates
+
+        currency_config = config["currency"]
+        return RateTable(
+            currency_config.get("rates_file", ".budget_cache/fx_rates.json"),
+            fetch=partial(fetch_ecb_rates, currency_config.get("rates_url", ECB_RATES_URL)),
+        )
 
-# Function to ensure equal lengths of arrays
-def ensure_equal_lengths(*arrays):
-    """
-    Ensure all arrays have the same length by padding with default values.
-    """
-    max_length = max(len(arr) for arr in arrays)
-    for arr in arrays:
-        while len(arr) < max_length:
-            if isinstance(arr, list):
-                arr.append("")  # Default value for strings
-            elif isinstance(arr, int):
-                arr.append(0)  # Default value for numbers
+    return timed_build("rate_table", build)
+
+# Function to get the currency amounts are shown in for this session, among
+# the ones there is a rate for
+def display_currency():
+    currency = st.session_state.get("display_currency", config["currency"].get("display", DEFAULT_CURRENCY))
+    return currency if currency in get_rate_table().rates else DEFAULT_CURRENCY
+
+# Function to pick the display currency and refresh the exchange rates
+def show_currency_settings():
+    rates = get_rate_table()
+    currencies = rates.currencies
+    st.sidebar.selectbox(
+        "Valuta di visualizzazione",
+        currencies,
+        index=currencies.index(display_currency()),
+        key="display_currency",
+    )
+    st.sidebar.caption(f"Tassi di cambio BCE del {rates.as_of}" if rates.as_of else "Tassi di cambio non ancora scaricati")
+    if st.sidebar.button("Aggiorna tassi di cambio"):
+        try:
+            with span("fx.refresh"):
+                rates.refresh()
+        except Exception as e:
+            st.sidebar.error(f"Impossibile aggiornare i tassi di cambio: {e}")
+            return
+        st.rerun()
+
+# Function to get the document store of the budget selected in this session
+def current_document_store():
+    return get_document_store(st.session_state["budget_id"], st.session_state["budget_document"])
+
+# Attachment files of each budget, encrypted like the budget itself
+@st.cache_resource
+def get_attachment_store(document_name):
+    def encrypt_file(data, compress=True):
+        with span("encrypt", bytes=len(data)):
+            return envelope.encrypt(data, compress=compress)
+
+    def decrypt_file(encrypted_data):
+        with span("decrypt", bytes=len(encrypted_data)):
+            return envelope.decrypt(encrypted_data)
+
+    return AttachmentStore(
+        backend,
+        document_name,
+        encrypt=encrypt_file,
+        decrypt=decrypt_file,
+        max_size=int(config["storage"].get("max_attachment_mb", 25)) * 1024 * 1024,
+    )
+
+# Thumbnails never change once uploaded, so each is downloaded once per process
+@st.cache_data(max_entries=512)
+def get_thumbnail(document_name, attachment_id):
+    return get_attachment_store(document_name).thumbnail(attachment_id)
+
+# Attachments are immutable too: the file offered for download is fetched and
+# decrypted once, not on every rerun while the download button is shown.
+# Only a few are kept, they can be several MB each
+@st.cache_data(max_entries=8, ttl=600, show_spinner="Preparazione del download...")
+def get_attachment(document_name, attachment_id):
+    return get_attachment_store(document_name).read(attachment_id) or b""
+
+# Past versions of each budget, shared by all sessions: decrypted entries and
+# rebuilt versions are reused by everyone browsing the history
+@st.cache_resource
+def get_history(budget_id, document_name):
+    return History(get_document_store(budget_id, document_name))
+
+# Per-session write-behind queue for each budget: changes are coalesced and
+# uploaded from a background thread so the UI never waits on encrypt + upload
+def current_write_queue():
+    write_queues = st.session_state.setdefault("write_queues", {})
+    document_name = st.session_state["budget_document"]
+    if document_name not in write_queues:
+        write_queues[document_name] = WriteBehindQueue(
+            current_document_store(),
+            delay=float(config["storage"].get("write_delay_seconds", 1.0)),
+            author=st.session_state["user_info"]["email"],
+        )
+    return write_queues[document_name]
+
+# Function to pick the budget to work on, among the ones the user can open
+def select_budget():
+    email = st.session_state["user_info"]["email"]
+    budgets = dict(budget_index.budgets_for(email))
+
+    with st.sidebar.expander("Nuovo budget"):
+        new_budget_name = st.text_input("Nome del budget", placeholder="Viaggio di nozze")
+        co_owners = st.text_input("Condiviso con (email separate da virgola)")
+        if st.button("Crea budget") and new_budget_name:
+            owners = [email] + [owner.strip() for owner in co_owners.split(",") if owner.strip()]
+            budget_id = budget_index.create(new_budget_name, owners)
+            st.session_state["budget_id"] = budget_id
+            budgets = dict(budget_index.budgets_for(email))
+
+    if not budgets:
+        st.info("Nessun budget disponibile: creane uno dalla barra laterale.")
+        return False
+
+    budget_ids = list(budgets)
+    selected = st.session_state.get("budget_id")
+    budget_id = st.sidebar.selectbox(
+        "Budget",
+        budget_ids,
+        index=budget_ids.index(selected) if selected in budgets else 0,
+        format_func=lambda key: budgets[key]["name"],
+    )
+    st.session_state["budget_id"] = budget_id
+    st.session_state["budget_document"] = budgets[budget_id]["document"]
+    return True
 
 # Function to load data from the encrypted JSON file
+@traced("load_data")
 def load_data():
+    document_store = current_document_store()
+    # Changes still waiting in the write queue are applied on top
+    pending_changes = current_write_queue().pending()
     try:
-        # Check if the file exists in GCS
-        if blob.exists():
-            encrypted_data = blob.download_as_bytes()
-            data = decrypt_data(encrypted_data)
-            categories = data.get("categories", [])
-            estimated_budgets = [int(budget) for budget in data.get("estimated_budgets", [])]
-            actual_budgets = [int(budget) for budget in data.get("actual_budgets", [])]
-            notes = data.get("notes", [])
-            paid_by = data.get("paid_by", [])
-            payment_done = data.get("payment_done", [])
-            return categories, estimated_budgets, actual_budgets, notes, paid_by, payment_done
+        budget = document_store.load()
+        st.session_state["load_failed"] = False
+        # Version of the shared cache this session is now showing
+        st.session_state["seen_revision"] = document_store.cache.revision
+        if document_store.offline:
+            st.warning(
+                "Dati dalla copia locale: sincronizzazione con GCS in corso o GCS non raggiungibile. "
+                "Le modifiche verranno salvate appena possibile."
+            )
+        if budget is not None:
+            # Copy the cached budget, callers mutate what we return
+            return apply_changes(budget.copy(), pending_changes)
         else:
-            st.warning("No data found in GCS. Initializing empty data.")
-            return [], [], [], [], [], []
+            if not pending_changes:
+                st.warning("No data found in GCS. Initializing empty data.")
+            return apply_changes(Budget(), pending_changes)
     except Exception as e:
+        # Nothing to show and nothing safe to save on top of
+        st.session_state["load_failed"] = True
+        document_store.cache.invalidate()
         st.error(f"Error loading data from GCS: {e}")
-        return [], [], [], [], [], []
-
-# Function to save data to the encrypted JSON file
-def save_data(categories, estimated_budgets, actual_budgets, notes, paid_by, payment_done):
+        return Budget()
+
+# Function to tell whether a grid on the page holds edits not saved yet. The
+# grids are keyed by the data they show, so a rerun on new data drops them.
+def has_unsaved_edits():
+    return any(
+        state.get("edited_rows") or state.get("added_rows") or state.get("deleted_rows")
+        for key, state in st.session_state.items()
+        if str(key).startswith(("budget_editor_", "schedule_editor_")) and isinstance(state, dict)
+    )
+
+# Function to rerun the app when the budget changed, e.g. saved by someone
+# else. Every session polls the process-wide cache, so storage only sees one
+# metadata check per cache TTL however many users are connected.
+@st.fragment(run_every=float(config["storage"].get("poll_seconds", 10)) or None)
+def watch_changes():
+    if current_document_store().poll() == st.session_state.get("seen_revision"):
+        return
+    if not has_unsaved_edits():
+        st.rerun()
+    # Never throw away someone's edits: let them save or reload first
+    st.info("Il budget è stato modificato da un altro utente. Salva le tue modifiche o ricarica per vedere le sue.")
+    if st.button("Ricarica"):
+        st.rerun()
+
+# Function to tell whether changes can be saved: not on top of a budget that
+# failed to load
+def can_save():
+    if st.session_state.get("load_failed"):
+        st.error("Impossibile salvare: i dati non sono stati caricati da GCS. Riprova più tardi.")
+        return False
+    return True
+
+# Function to save changes to the encrypted change log
+def save_data(changes):
     """
-    Save the data to the encrypted JSON file in GCS.
+    Queue the changes (see budget.changes) for the change log in GCS.
+    Return whether they were queued.
     """
-    data = {
-        "categories": categories,
-        "estimated_budgets": estimated_budgets,
-        "actual_budgets": actual_budgets,
-        "notes": notes,
-        "paid_by": paid_by,
-        "payment_done": payment_done,
-    }
-    try:
-        # Encrypt the data
-        encrypted_data = encrypt_data(data)
-
-        # Debugging: Log the data being saved
-        print("Saving data to GCS:")
-        print(json.dumps(data, indent=4))
-
-        # Upload the encrypted data to GCS
-        blob.upload_from_string(encrypted_data, content_type="application/octet-stream")
-        st.success("Data saved to Google Cloud Storage successfully.")
-    except Exception as e:
-        st.error(f"Error saving data to GCS: {e}")
-        print(f"Error saving data to GCS: {e}")
+    if not changes:
+        return False
+    if not can_save():
+        return False
+    # Only the size goes to the trace, never the (decrypted) contents
+    with span("save_data", changes=len(changes), bytes=len(json.dumps(changes))):
+        # Uploaded in the background, concurrent editors are merged by item id
+        current_write_queue().submit(changes)
+    return True
+
+# Function to report background saves finished since the last rerun
+def report_saves():
+    pending_count = 0
+    for write_queue in st.session_state.get("write_queues", {}).values():
+        for result in write_queue.drain_results():
+            tracer.record("storage.flush", result.latency, changes=result.changes, ok=result.ok)
+            if result.ok:
+                st.toast(f"{result.changes} modifiche salvate in {result.latency * 1000:.0f} ms")
+            else:
+                st.toast(f":red[Errore nel salvataggio su GCS: {result.error}]")
+                print(f"Error saving data to GCS: {result.error}")
+        pending_count += len(write_queue.pending())
+    if pending_count:
+        st.sidebar.caption(f"Modifiche in attesa di salvataggio: {pending_count}")
 
 # Function to trigger a rerun by modifying a dummy session state variable
 def trigger_rerun():
@@ -154,17 +414,272 @@ def trigger_rerun():
         st.session_state["rerun"] = 0
     st.session_state["rerun"] += 1
 
-# Function to export the table as a CSV file
-def export_to_csv():
-    data = {
-        "Categoria": st.session_state["categories"],
-        "Budget Stimato (€)": st.session_state["estimated_budgets"],
-        "Budget Reale (€)": st.session_state["actual_budgets"],
-        "Note": st.session_state["notes"],
-        "Pagato Da": st.session_state["paid_by"],
-    }
-    df = pd.DataFrame(data)
-    return df.to_csv(index=False).encode("utf-8")
+# Exported file, generated only when requested and cached per budget version
+@st.cache_data(max_entries=8)
+def get_export(fingerprint, export_format, _budget):
+    from budget.export import export_bytes
+
+    return export_bytes(_budget, export_format)
+
+# Function to offer the table for download in the chosen format
+def show_export(budget, fingerprint):
+    from budget.export import EXPORT_FORMATS
+
+    format_column, button_column = st.columns([2, 1])
+    export_format = format_column.selectbox(
+        "Formato di esportazione",
+        list(EXPORT_FORMATS),
+        format_func=lambda key: EXPORT_FORMATS[key].label,
+    )
+    if button_column.button("Prepara esportazione"):
+        st.session_state["export_format"] = export_format
+    if st.session_state.get("export_format") != export_format:
+        return
+
+    details = EXPORT_FORMATS[export_format]
+    st.download_button(
+        label=f"Esporta come {details.label}",
+        data=get_export(fingerprint, export_format, budget),
+        file_name=f"budget_table.{details.extension}",
+        mime=details.mime,
+    )
+
+# Budget aggregates, computed once per budget version, exchange rates and
+# display currency
+@st.cache_data(max_entries=8)
+def get_budget_summary(fingerprint, rates_version, currency, _budget):
+    from budget.analytics import summarize
+
+    return summarize(_budget.to_columns(), get_rate_table(), currency)
+
+# Function to show the summary metrics next to the table
+def show_budget_summary(budget, fingerprint):
+    from budget.fx import MissingRateError
+
+    currency = display_currency()
+    try:
+        summary = get_budget_summary(fingerprint, get_rate_table().version, currency, budget)
+    except MissingRateError as e:
+        st.warning(f"Totali non disponibili in {currency}, manca il tasso di cambio di {', '.join(e.currencies)}.")
+        return None
+    total_estimated, total_actual, outstanding = st.columns(3)
+    total_estimated.metric("Totale Stimato", format_amount(summary.total_estimated, currency))
+    total_actual.metric(
+        "Totale Reale",
+        format_amount(summary.total_actual, currency),
+        delta=("+" if summary.variance >= 0 else "") + format_amount(summary.variance, currency),
+        delta_color="inverse",
+    )
+    outstanding.metric("Da Pagare", format_amount(summary.outstanding, currency))
+    with st.expander(f"Dettaglio per pagante e sforamenti ({currency})"):
+        st.dataframe(summary.by_payer, use_container_width=True)
+        if len(summary.overruns) > 0:
+            st.dataframe(summary.overruns, hide_index=True, use_container_width=True)
+        else:
+            st.write("Nessuna categoria oltre il budget stimato.")
+    return summary
+
+# Function to bulk import categories from a CSV or Excel file
+def show_import(budget):
+    with st.expander("Importa da CSV/Excel"):
+        uploaded_file = st.file_uploader("File da importare", type=["csv", "xlsx", "xls"])
+        if uploaded_file is None:
+            return
+
+        from budget.importer import describe_changes, parse_import, plan_import, read_table
+
+        try:
+            result = parse_import(read_table(uploaded_file, uploaded_file.name), budget)
+        except Exception as e:
+            st.error(f"Impossibile leggere il file: {e}")
+            return
+        if result.errors:
+            st.error("Il file contiene errori, nessuna modifica importata:")
+            st.write("\n".join(f"- {error}" for error in result.errors))
+            return
+
+        # Dry run: categories are matched by name, nothing is saved yet
+        changes = plan_import(budget, result.rows)
+        if not changes:
+            st.info("Il file non contiene modifiche rispetto al budget attuale.")
+            return
+        st.dataframe(describe_changes(budget, changes), hide_index=True, use_container_width=True)
+        if st.button(f"Conferma importazione ({len(changes)} modifiche)"):
+            # All rows are committed together as a single write
+            if save_data(changes):
+                st.success(f"{len(changes)} categorie importate!")
+
+# Function to show, add and remove the files attached to a category
+def show_attachments(budget):
+    with st.expander("Allegati (contratti, ricevute, fatture)"):
+        items = list(budget)
+        item = st.selectbox("Categoria", items, format_func=lambda item: item.category, key="attachments_item")
+        attachment_store = get_attachment_store(st.session_state["budget_document"])
+
+        # Only thumbnails are downloaded here, files only when asked for
+        for attachment in budget.attachments_for(item.id):
+            preview, details, actions = st.columns([1, 3, 2])
+            thumbnail = get_thumbnail(attachment_store.document_name, attachment.id) if attachment.thumbnail else None
+            if thumbnail is not None:
+                preview.image(thumbnail)
+            else:
+                preview.write("📄")
+            details.write(f"**{attachment.name}**  \n{attachment.size / 1024:.0f} KB, caricato da {attachment.uploaded_by or 'sconosciuto'}")
+            if st.session_state.get("attachment_download") == attachment.id:
+                actions.download_button(
+                    "Scarica",
+                    data=get_attachment(attachment_store.document_name, attachment.id),
+                    file_name=attachment.name,
+                    mime=attachment.mime,
+                    key=f"download_{attachment.id}",
+                )
+            elif actions.button("Prepara download", key=f"prepare_{attachment.id}"):
+                st.session_state["attachment_download"] = attachment.id
+                st.rerun()
+            if actions.button("Rimuovi", key=f"detach_{attachment.id}"):
+                if save_data([detach_change(attachment.id)]):
+                    st.success(f"Allegato '{attachment.name}' rimosso.")
+
+        uploaded_file = st.file_uploader(
+            "Aggiungi un allegato",
+            type=["pdf", "png", "jpg", "jpeg", "webp"],
+            key=f"attachment_upload_{item.id}",
+        )
+        # Checked before uploading, or the file would be stored and never referenced
+        if uploaded_file is not None and st.button("Carica allegato") and can_save():
+            try:
+                with st.spinner("Caricamento in corso..."):
+                    attachment = attachment_store.upload(
+                        item.id,
+                        uploaded_file.name,
+                        uploaded_file.getvalue(),
+                        uploaded_file.type,
+                        author=st.session_state["user_info"]["email"],
+                    )
+            except Exception as e:
+                st.error(f"Impossibile caricare l'allegato: {e}")
+                return
+            # The file is stored, the reference goes through the change log
+            if save_data([attach_change(attachment)]):
+                st.success(f"Allegato '{attachment.name}' aggiunto a {item.category}.")
+
+# Function to edit the deposits and installments of a category
+def show_payment_schedule(budget, schedule_version):
+    with st.expander("Piano pagamenti (acconti e rate)"):
+        from budget.frame import ID_COLUMN, installments_from_frame, installments_to_frame
+        from budget.model import INSTALLMENT_LABELS
+
+        item = st.selectbox("Categoria", list(budget), format_func=lambda item: item.category, key="schedule_item")
+        # Keyed by the schedule like the main grid, so edits start over when it changes
+        edited_df = st.data_editor(
+            installments_to_frame(budget, item.id),
+            key=f"schedule_editor_{item.id}_{schedule_version}",
+            num_rows="dynamic",
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                ID_COLUMN: None,
+                INSTALLMENT_LABELS["due_date"]: st.column_config.DateColumn(required=True, format="DD/MM/YYYY"),
+                INSTALLMENT_LABELS["amount"]: st.column_config.NumberColumn(
+                    f"{INSTALLMENT_LABELS['amount']} ({item.currency})", min_value=0, step=0.01, format="%.2f"
+                ),
+                INSTALLMENT_LABELS["paid"]: st.column_config.CheckboxColumn(default=False),
+            },
+        )
+
+        if st.button("Salva piano pagamenti"):
+            edited = budget.copy()
+            for installment in edited.installments_for(item.id):
+                edited.remove_installment(installment.id)
+            for installment in installments_from_frame(edited_df, item.id, item.currency):
+                edited.add_installment(installment)
+            changes = diff_installments(budget, edited)
+            if changes:
+                if save_data(changes):
+                    # Rerun on the saved schedule, so the grid is re-keyed and its
+                    # edits are not taken for someone else's once they are flushed
+                    st.toast(f"Piano pagamenti di {item.category} salvato!")
+                    st.rerun()
+            else:
+                st.info("Nessuna modifica da salvare.")
+
+# Cash-flow projection, computed once per schedule version, day, exchange
+# rates and display currency
+@st.cache_data(max_entries=8)
+def get_cash_flow(schedule_version, today_iso, rates_version, currency, _budget):
+    from budget.cashflow import project_cash_flow
+
+    return project_cash_flow(_budget, date.fromisoformat(today_iso), get_rate_table(), currency)
+
+# Function to show the monthly cash flow and the overdue installments
+def show_cash_flow(budget, schedule_version):
+    from budget.fx import MissingRateError
+
+    currency = display_currency()
+    try:
+        cash_flow = get_cash_flow(
+            schedule_version, date.today().isoformat(), get_rate_table().version, currency, budget
+        )
+    except MissingRateError as e:
+        st.warning(f"Flusso di cassa non disponibile in {currency}, manca il tasso di cambio di {', '.join(e.currencies)}.")
+        return
+    overdue, next_30_days, unscheduled = st.columns(3)
+    overdue.metric("Scaduto", format_amount(cash_flow.total_overdue, currency))
+    next_30_days.metric("In scadenza entro 30 giorni", format_amount(cash_flow.due_next_30_days, currency))
+    unscheduled.metric("Non pianificato", format_amount(cash_flow.unscheduled, currency))
+    if len(cash_flow.monthly) == 0:
+        st.write("Nessuna rata pianificata ancora.")
+        return
+    show_cash_flow_chart(cash_flow)
+    if len(cash_flow.overdue) > 0:
+        st.dataframe(cash_flow.overdue, hide_index=True, use_container_width=True)
+
+# Function to browse past versions and restore one
+def show_history(budget):
+    with st.expander("Cronologia modifiche"):
+        # Nothing is listed until asked for, and only metadata then
+        if not st.toggle("Mostra cronologia"):
+            return
+
+        from budget.importer import describe_changes
+
+        history = get_history(st.session_state["budget_id"], st.session_state["budget_document"])
+        versions = history.versions()
+        if not versions:
+            st.write("Nessuna modifica salvata ancora.")
+            return
+
+        # Newest first, down to the state before the first saved change
+        versions = versions[::-1] + [Version(0, None, 0)]
+        version = st.selectbox(
+            "Versione",
+            versions,
+            format_func=lambda version: (
+                f"#{version.seq} del {time.strftime('%d/%m/%Y %H:%M', time.localtime(version.updated))}"
+                if version.updated else f"#{version.seq}" if version.seq else "Versione iniziale"
+            ),
+        )
+
+        # Only the selected version is downloaded and decrypted
+        if version.seq:
+            detail = history.detail(version.seq)
+            previous = history.budget_at(version.seq - 1)
+            if detail is None or previous is None:
+                st.warning("Questa versione non è più ricostruibile.")
+                return
+            st.caption(f"Salvata da {detail.author or 'sconosciuto'}")
+            st.dataframe(describe_changes(previous, detail.changes), hide_index=True, use_container_width=True)
+
+        if st.button(f"Ripristina la versione #{version.seq}"):
+            changes = history.restore_changes(version.seq, budget)
+            if changes is None:
+                st.warning("Questa versione non è più ricostruibile.")
+            elif changes:
+                # Restoring is a new change on top, the history is kept
+                if save_data(changes):
+                    st.success(f"Versione #{version.seq} ripristinata ({len(changes)} modifiche).")
+            else:
+                st.info("Il budget è già uguale a questa versione.")
 
 # Function to display the app
 def wedding_budget_app():
@@ -172,15 +687,21 @@ def wedding_budget_app():
 
     # Logout button
     if st.button("Logout"):
+        # Make sure queued changes reach GCS before the session is cleared
+        for write_queue in st.session_state.get("write_queues", {}).values():
+            if not write_queue.flush(timeout=10):
+                st.error("Alcune modifiche non sono ancora state salvate su GCS.")
+        report_saves()
+
         # Clear only the app-related session state variables
         keys_to_clear = [
-            "categories",
-            "estimated_budgets",
-            "actual_budgets",
-            "notes",
-            "paid_by",
-            "payment_done",
+            "budget",
+            "budget_id",
+            "budget_document",
+            "export_format",
             "refresh",
+            # Queues write as the logged in user, flushed above
+            "write_queues",
         ]
         for key in keys_to_clear:
             if key in st.session_state:
@@ -198,177 +719,187 @@ def wedding_budget_app():
     if "refresh" not in st.session_state:
         st.session_state["refresh"] = False
 
+    # Pick the budget (wedding, honeymoon, ...) to work on
+    if not select_budget():
+        return
+
     # Load data from JSON file if available
-    categories, estimated_budgets, actual_budgets, notes, paid_by, payment_done = load_data()
-
-    # Store data in session state for editing
-    st.session_state["categories"] = categories
-    st.session_state["estimated_budgets"] = estimated_budgets
-    st.session_state["actual_budgets"] = actual_budgets
-    st.session_state["notes"] = notes
-    st.session_state["paid_by"] = paid_by
-    st.session_state["payment_done"] = payment_done
-
-    # Input for custom category name and budget
-    st.subheader("Aggiungi una Categoria Personalizzata")
-    new_category = st.text_input("Nome Categoria")
-    new_estimated_budget = st.number_input("Budget Stimato (€)", min_value=0, value=0)
-    new_actual_budget = st.number_input("Budget Reale (€)", min_value=0, value=0)
-    new_note = st.text_input("Note")
-    new_paid_by = st.text_input("Pagato Da")
-    new_payment_done = st.checkbox("Pagamento Effettuato")
-
-    # Add the category if fields are filled
-    if st.button("Aggiungi Categoria"):
-        if new_category and new_estimated_budget >= 0:
-            st.session_state["categories"].append(new_category)
-            st.session_state["estimated_budgets"].append(new_estimated_budget)
-            st.session_state["actual_budgets"].append(new_actual_budget)
-            st.session_state["notes"].append(new_note)
-            st.session_state["paid_by"].append(new_paid_by)
-            st.session_state["payment_done"].append(new_payment_done)
-            save_data(
-                st.session_state["categories"],
-                st.session_state["estimated_budgets"],
-                st.session_state["actual_budgets"],
-                st.session_state["notes"],
-                st.session_state["paid_by"],
-                st.session_state["payment_done"],
-            )
-            st.success(f"Categoria '{new_category}' aggiunta con successo!")
+    budget = load_data()
+    st.session_state["budget"] = budget
+
+    report_saves()
+    if config["storage"].get("poll_seconds", 10):
+        watch_changes()
+
+    # Show read cache counters
+    stats = current_document_store().cache.stats
+    st.sidebar.caption(
+        f"Cache letture: {stats.hits} hit, {stats.misses} miss, {stats.revalidations} riconvalide"
+    )
+    cookie_wait = st.session_state.get("auth_timings", {}).get("cookie_wait")
+    if cookie_wait is not None:
+        st.sidebar.caption(f"Attesa cookie al login: {cookie_wait * 1000:.0f} ms")
+
+    show_currency_settings()
+    currencies = get_rate_table().currencies
+
+    with span("render.add_form"):
+        # Input for custom category name and budget
+        st.subheader("Aggiungi una Categoria Personalizzata")
+        new_category = st.text_input("Nome Categoria")
+        new_currency = st.selectbox("Valuta", currencies, index=currencies.index(display_currency()))
+        new_estimated_budget = st.number_input("Budget Stimato", min_value=0.0, value=0.0, step=0.01, format="%.2f")
+        new_actual_budget = st.number_input("Budget Reale", min_value=0.0, value=0.0, step=0.01, format="%.2f")
+        new_note = st.text_input("Note")
+        new_paid_by = st.text_input("Pagato Da")
+        new_payment_done = st.checkbox("Pagamento Effettuato")
+
+        # Add the category if fields are filled
+        if st.button("Aggiungi Categoria"):
+            if new_category and new_estimated_budget >= 0:
+                item = budget.add(
+                    new_category,
+                    # Stored in cents, exactly
+                    estimated_budget=to_minor(new_estimated_budget, new_currency),
+                    actual_budget=to_minor(new_actual_budget, new_currency),
+                    currency=new_currency,
+                    note=new_note,
+                    paid_by=new_paid_by,
+                    payment_done=new_payment_done,
+                )
+                if save_data([add_change(item)]):
+                    st.success(f"Categoria '{new_category}' aggiunta con successo!")
 
-    # Display current categories and budgets in a table
-    st.subheader("Categorie Aggiunte")
-    if len(st.session_state["categories"]) > 0:
-        # Ensure all arrays have the same length
-        ensure_equal_lengths(
-            st.session_state["categories"],
-            st.session_state["estimated_budgets"],
-            st.session_state["actual_budgets"],
-            st.session_state["notes"],
-            st.session_state["paid_by"],
-            st.session_state["payment_done"],
-        )
+    with span("render.import"):
+        show_import(budget)
 
-        # Create a DataFrame for the table
-        data = {
-            "Categoria": st.session_state["categories"],
-            "Budget Stimato (€)": st.session_state["estimated_budgets"],
-            "Budget Reale (€)": st.session_state["actual_budgets"],
-            "Note": st.session_state["notes"],
-            "Pagato Da": st.session_state["paid_by"],
-            "Pagamento Effettuato": st.session_state["payment_done"],
-        }
-        df = pd.DataFrame(data)
-        st.table(df)  # Display the table
-
-        # Add a download button to export the table as a CSV file
-        csv_data = export_to_csv()
-        st.download_button(
-            label="Esporta come CSV",
-            data=csv_data,
-            file_name="budget_table.csv",
-            mime="text/csv",
-        )
+    with span("render.history"):
+        show_history(budget)
 
-        # Display the pie chart for "Budget Stimato (€)"
-        st.subheader("Distribuzione Budget Stimato")
-        if len(st.session_state["categories"]) > 0:
-            fig, ax = plt.subplots(figsize=(8, 8))
-            ax.pie(
-                st.session_state["estimated_budgets"],
-                labels=st.session_state["categories"],
-                autopct="%1.1f%%",
-                startangle=140,
-            )
-            ax.set_title("Distribuzione Budget Stimato (€)")
-            st.pyplot(fig)
-
-        # Editable fields for each category
-        for idx, category in enumerate(st.session_state["categories"]):
-            st.write(f"**Modifica Categoria {idx + 1}: {category}**")
-
-            # Editable fields for each category
-            new_category_name = st.text_input(
-                f"Modifica Nome Categoria {idx + 1}",
-                value=category,
-                key=f"category_{idx}",
-            )
-            new_estimated_budget = st.number_input(
-                f"Modifica Budget Stimato (€) per {category}",
-                min_value=0,
-                value=st.session_state["estimated_budgets"][idx],
-                key=f"estimated_budget_{idx}",
-            )
-            new_actual_budget = st.number_input(
-                f"Modifica Budget Reale (€) per {category}",
-                min_value=0,
-                value=st.session_state["actual_budgets"][idx],
-                key=f"actual_budget_{idx}",
-            )
-            new_note = st.text_input(
-                f"Modifica Note per {category}",
-                value=st.session_state["notes"][idx],
-                key=f"note_{idx}",
-            )
-            new_paid_by = st.text_input(
-                f"Modifica Pagato Da per {category}",
-                value=st.session_state["paid_by"][idx],
-                key=f"paid_by_{idx}",
-            )
-            new_payment_done = st.checkbox(
-                f"Pagamento Effettuato per {category}",
-                value=st.session_state["payment_done"][idx],
-                key=f"payment_done_{idx}",
+    # Display current categories and budgets in a single editable grid
+    st.subheader("Categorie Aggiunte")
+    if len(budget) > 0:
+        # Heavy imports are deferred until there is something to show
+        from budget.frame import ID_COLUMN, budget_from_frame, budget_to_frame
+
+        # Version of the budget shown in this rerun, keys every cache below
+        fingerprint = budget.fingerprint()
+        schedule_version = (fingerprint, budget.schedule_fingerprint())
+
+        with span("render.summary"):
+            summary = show_budget_summary(budget, fingerprint)
+
+        with span("render.editor", items=len(budget)):
+            # The editor stores edits by row position, so it is keyed by the data
+            # it was built from: when the budget changes the edits start over
+            editor_key = f"budget_editor_{fingerprint}"
+            with span("budget_to_frame"):
+                budget_frame = budget_to_frame(budget)
+            edited_df = st.data_editor(
+                budget_frame,
+                key=editor_key,
+                num_rows="dynamic",
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    ID_COLUMN: None,
+                    COLUMN_LABELS["category"]: st.column_config.TextColumn(required=True),
+                    COLUMN_LABELS["estimated_budget"]: st.column_config.NumberColumn(min_value=0, step=0.01, format="%.2f"),
+                    COLUMN_LABELS["actual_budget"]: st.column_config.NumberColumn(min_value=0, step=0.01, format="%.2f"),
+                    # Currencies without a rate yet stay selectable on their items
+                    COLUMN_LABELS["currency"]: st.column_config.SelectboxColumn(
+                        options=sorted(set(currencies) | {item.currency for item in budget}),
+                        default=display_currency(),
+                        required=True,
+                    ),
+                    COLUMN_LABELS["payment_done"]: st.column_config.CheckboxColumn(default=False),
+                },
             )
 
-            # Save changes button
-            if st.button(f"Salva Modifiche per {category}", key=f"save_{idx}"):
-                # Update session state with new values
-                st.session_state["categories"][idx] = new_category_name
-                st.session_state["estimated_budgets"][idx] = new_estimated_budget
-                st.session_state["actual_budgets"][idx] = new_actual_budget
-                st.session_state["notes"][idx] = new_note
-                st.session_state["paid_by"][idx] = new_paid_by
-                st.session_state["payment_done"][idx] = new_payment_done
-
-                # Save data to GCS
-                save_data(
-                    st.session_state["categories"],
-                    st.session_state["estimated_budgets"],
-                    st.session_state["actual_budgets"],
-                    st.session_state["notes"],
-                    st.session_state["paid_by"],
-                    st.session_state["payment_done"],
-                )
-                st.success(f"Modifiche salvate per la categoria '{new_category_name}'!")
-
-            # Remove category button
-            if st.button(f"Rimuovi {category}", key=f"remove_{idx}"):
-                # Remove the category and associated data
-                del st.session_state["categories"][idx]
-                del st.session_state["estimated_budgets"][idx]
-                del st.session_state["actual_budgets"][idx]
-                del st.session_state["notes"][idx]
-                del st.session_state["paid_by"][idx]
-                del st.session_state["payment_done"][idx]
-
-                # Save updated data to GCS
-                save_data(
-                    st.session_state["categories"],
-                    st.session_state["estimated_budgets"],
-                    st.session_state["actual_budgets"],
-                    st.session_state["notes"],
-                    st.session_state["paid_by"],
-                    st.session_state["payment_done"],
-                )
-                st.success(f"Categoria '{category}' rimossa con successo!")
+            # Save only the rows that actually changed, as one batch
+            if st.button("Salva Modifiche"):
+                changes = diff_budgets(budget, budget_from_frame(edited_df))
+                if changes:
+                    if save_data(changes):
+                        # The grid is re-keyed on the saved budget, see show_payment_schedule
+                        st.toast(f"{len(changes)} modifiche salvate!")
+                        st.rerun()
+                else:
+                    st.info("Nessuna modifica da salvare.")
+
+        with span("render.attachments"):
+            show_attachments(budget)
+
+        with span("render.payment_schedule"):
+            show_payment_schedule(budget, hash(schedule_version))
 
-                # Trigger a refresh by toggling the refresh variable
-                st.session_state["refresh"] = not st.session_state.get("refresh", False)
+        # Export is only generated once someone asks for it
+        with span("render.export"):
+            show_export(budget, fingerprint)
+
+        # Display the pie chart for "Budget Stimato", in the display currency
+        st.subheader("Distribuzione Budget Stimato")
+        if summary is not None:
+            with span("render.chart", mode=config["chart_mode"]):
+                show_estimated_budget_chart(summary, mode=config["chart_mode"])
+
+        st.subheader("Flusso di Cassa")
+        with span("render.cash_flow", installments=len(budget.installments)):
+            show_cash_flow(budget, schedule_version)
 
     else:
         st.write("Nessuna categoria aggiunta ancora.")
 
+# Function to report how long this rerun took and what the bootstrap cost
+def report_timings():
+    tracing_config = config["tracing"]
+    trace = tracer.finish(items=len(st.session_state.get("budget", ())))
+    if tracing_config.get("log", False):
+        export_trace(trace)
+
+    # Breakdown of the last reruns of this session, for the profiling panel
+    history = st.session_state.setdefault("traces", [])
+    history.append({
+        "started": time.strftime("%H:%M:%S", time.localtime(tracer.start_ns / 1e9)),
+        "total_ms": round(tracer.root.duration * 1000, 1),
+        "spans": tracer.breakdown()[1:],
+    })
+    del history[:-int(tracing_config.get("history", 20))]
+
+    st.sidebar.caption(f"Tempo rerun: {tracer.root.duration * 1000:.0f} ms")
+    with st.sidebar.expander("Tempi di avvio"):
+        for name, seconds in get_bootstrap_timings().items():
+            st.write(f"{name}: {seconds * 1000:.1f} ms")
+
+    # Comma separated like allowed_users
+    admins = [admin.strip() for admin in tracing_config.get("admins", "").split(",") if admin.strip()]
+    if st.session_state.get("user_info", {}).get("email") in admins:
+        show_profiling_panel(history)
+
+# Function to show where the last reruns spent their time (admins only)
+def show_profiling_panel(history):
+    with st.sidebar.expander("Profilazione rerun"):
+        top_level = [
+            {
+                "Ora": rerun["started"],
+                "Totale (ms)": rerun["total_ms"],
+                **{span_row["name"]: span_row["ms"] for span_row in rerun["spans"] if span_row["depth"] == 1},
+            }
+            for rerun in reversed(history)
+        ]
+        st.dataframe(top_level, hide_index=True, use_container_width=True)
+
+        selected = st.selectbox(
+            "Dettaglio rerun",
+            range(len(history)),
+            format_func=lambda idx: f"{history[-1 - idx]['started']} ({history[-1 - idx]['total_ms']} ms)",
+        )
+        for span_row in history[-1 - selected]["spans"]:
+            attributes = ", ".join(
+                f"{key}={value}" for key, value in span_row.items() if key not in ("name", "depth", "ms")
+            )
+            st.text(f"{'  ' * (span_row['depth'] - 1)}{span_row['name']}: {span_row['ms']} ms {attributes}".rstrip())
+
 # Run the app
 wedding_budget_app()
+report_timings()
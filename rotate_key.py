@@ -0,0 +1,56 @@
+import argparse
+import streamlit as st
+
+from store import BudgetIndex, create_backend, document_objects, rotate_objects
+from store.envelope import envelope_from_secrets
+
+# Load the encryption keys (current and previous) from secrets.toml
+envelope = envelope_from_secrets(st.secrets)
+
+def rotate_keys(dry_run=False):
+    """
+    Re-encrypt with the current key every object still using one of
+    ``previous_keys``: the budget index and, for every budget, its snapshot,
+    log entries, checkpoints and attachments. Return True once nothing uses a
+    previous key any more.
+    """
+    backend = create_backend(st.secrets)
+    budget_index = BudgetIndex(
+        backend,
+        st.secrets.get("storage", {}).get("index_name", "index.json"),
+        encrypt=envelope.encrypt_json,
+        decrypt=envelope.decrypt_json,
+        default_document=st.secrets.get("gcs", {}).get("file_name", "data.json"),
+    )
+
+    complete = True
+    for budget_id, entry in list(budget_index.entries().items()):
+        result = rotate_objects(backend, envelope, document_objects(backend, entry["document"]), dry_run=dry_run)
+        print(f"{entry['name']}: {len(result.rotated)} of {result.checked} objects "
+              f"{'to re-encrypt' if dry_run else 're-encrypted'}")
+        for name, error in result.failed.items():
+            print(f"  {name}: {error}")
+        complete = complete and not result.failed and (not dry_run or not result.rotated)
+        # The index remembers the generation of each snapshot
+        generation = result.rotated.get(entry["document"])
+        if generation and entry.get("generation") is not None:
+            budget_index.record_generation(budget_id, generation)
+
+    result = rotate_objects(backend, envelope, [budget_index.name], dry_run=dry_run)
+    for name, error in result.failed.items():
+        print(f"  {name}: {error}")
+    complete = complete and not result.failed and (not dry_run or not result.rotated)
+    return complete
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-encrypt all stored objects with the current encryption key.")
+    parser.add_argument("--dry-run", action="store_true", help="only count the objects using a previous key")
+    args = parser.parse_args()
+
+    if rotate_keys(dry_run=args.dry_run):
+        print("Every object uses the current key: previous_keys can be removed.")
+    elif args.dry_run:
+        print("Some objects still use a previous key, keep previous_keys.")
+    else:
+        print("Some objects could not be re-encrypted, keep previous_keys and run again.")
+        raise SystemExit(1)
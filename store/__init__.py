@@ -0,0 +1,19 @@
+from .attachments import AttachmentStore
+from .backends import (
+    GCSBackend,
+    InMemoryBackend,
+    LocalFileBackend,
+    MeteredBackend,
+    ObjectInfo,
+    PreconditionFailed,
+    StorageBackend,
+    StoredObject,
+    create_backend,
+)
+from .budget_index import DEFAULT_BUDGET_ID, BudgetIndex, budget_document_name
+from .document_store import ConflictError, DocumentStore, StaleDataError
+from .history import History, Version, VersionDetail
+from .local_snapshot import LocalCopy, LocalSnapshot
+from .read_cache import CacheStats, ReadCache
+from .rotation import RotationResult, document_objects, rotate_object, rotate_objects
+from .write_queue import FlushResult, WriteBehindQueue
@@ -0,0 +1,107 @@
+import io
+import time
+from typing import Callable, Optional
+
+from budget.model import Attachment, new_item_id
+from .backends import PreconditionFailed, StorageBackend
+
+THUMBNAIL_SIZE = (160, 160)
+
+# Formats that are already compressed: compressing them again only costs CPU
+COMPRESSED_TYPES = ("image/", "application/pdf", "application/zip", "video/", "audio/")
+
+
+def make_thumbnail(data: bytes, size=THUMBNAIL_SIZE) -> Optional[bytes]:
+    """
+    Return a small JPEG preview of an image, or None if ``data`` is not an
+    image Pillow can read (or Pillow is not installed).
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # Decode at reduced size when the format supports it (JPEG)
+            image.draft("RGB", size)
+            image.thumbnail(size)
+            buffer = io.BytesIO()
+            image.convert("RGB").save(buffer, format="JPEG", quality=80)
+            return buffer.getvalue()
+    except Exception:
+        return None
+
+
+class AttachmentStore:
+    """
+    Files attached to the items of a budget document, each stored as its own
+    encrypted object next to the document (``<document>.attachments/<id>``)
+    plus, for images, an encrypted thumbnail made once at upload time. The
+    budget document only holds the ``Attachment`` references, so it stays
+    small and listing attachments never downloads a file.
+
+    Objects are created with ``if_generation_match=0`` and never overwritten
+    or deleted: detaching only drops the reference, so past versions in the
+    history keep their files.
+    """
+
+    def __init__(
+        self,
+        backend: StorageBackend,
+        document_name: str,
+        encrypt: Callable[..., bytes],
+        decrypt: Callable[[bytes], bytes],
+        max_size: int = 25 * 1024 * 1024,
+    ):
+        self.backend = backend
+        self.document_name = document_name
+        self.encrypt = encrypt
+        self.decrypt = decrypt
+        self.max_size = max_size
+
+    def blob_name(self, attachment_id: str) -> str:
+        return f"{self.document_name}.attachments/{attachment_id}"
+
+    def thumbnail_name(self, attachment_id: str) -> str:
+        return f"{self.document_name}.attachments/{attachment_id}.thumb"
+
+    def _create(self, name: str, data: bytes):
+        try:
+            self.backend.write(name, data, if_generation_match=0)
+        except PreconditionFailed:
+            # A retried upload that had already gone through
+            pass
+
+    def upload(self, item_id: str, file_name: str, data: bytes, mime: str, author: str = "") -> Attachment:
+        """
+        Store ``data`` and its thumbnail and return the reference to attach.
+        """
+        if len(data) > self.max_size:
+            raise ValueError(
+                f"{file_name} is {len(data) / 1024 / 1024:.1f} MB, the limit is {self.max_size / 1024 / 1024:.0f} MB"
+            )
+        attachment = Attachment(
+            id=new_item_id(),
+            item_id=item_id,
+            name=file_name,
+            mime=mime or "application/octet-stream",
+            size=len(data),
+            uploaded_by=author,
+            uploaded_at=time.time(),
+        )
+        compress = not attachment.mime.startswith(COMPRESSED_TYPES)
+        self._create(self.blob_name(attachment.id), self.encrypt(data, compress=compress))
+        if attachment.mime.startswith("image/"):
+            thumbnail = make_thumbnail(data)
+            if thumbnail is not None:
+                self._create(self.thumbnail_name(attachment.id), self.encrypt(thumbnail, compress=False))
+                attachment.thumbnail = True
+        return attachment
+
+    def read(self, attachment_id: str) -> Optional[bytes]:
+        stored = self.backend.read(self.blob_name(attachment_id))
+        return self.decrypt(stored.data) if stored is not None else None
+
+    def thumbnail(self, attachment_id: str) -> Optional[bytes]:
+        stored = self.backend.read(self.thumbnail_name(attachment_id))
+        return self.decrypt(stored.data) if stored is not None else None
@@ -0,0 +1,392 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import count
+from typing import Callable, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+_io_executor: Optional[ThreadPoolExecutor] = None
+_io_executor_lock = threading.Lock()
+
+
+def submit_io(function: Callable, *args, **kwargs) -> Future:
+    """
+    Run a blocking storage call on the process-wide I/O thread pool.
+    """
+    global _io_executor
+    with _io_executor_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="storage-io")
+    return _io_executor.submit(function, *args, **kwargs)
+
+
+class StoredObject(NamedTuple):
+    data: bytes
+    generation: int
+
+
+class ObjectInfo(NamedTuple):
+    name: str
+    generation: int
+    size: int
+    # Last write, in seconds since the epoch
+    updated: Optional[float] = None
+
+
+class PreconditionFailed(Exception):
+    """Raised when a write's ``if_generation_match`` does not hold."""
+
+
+class StorageBackend(ABC):
+    """
+    Minimal object store used by the app: named blobs of encrypted bytes,
+    each with a generation that changes on every write.
+
+    ``if_generation_match=0`` means "only create, the object must not exist",
+    matching the GCS precondition semantics.
+    """
+
+    @abstractmethod
+    def generation(self, name: str) -> Optional[int]:
+        """Return the current generation of ``name``, or None if it does not exist."""
+
+    @abstractmethod
+    def read(self, name: str) -> Optional[StoredObject]:
+        """Return the object's bytes and generation, or None if it does not exist."""
+
+    @abstractmethod
+    def write(self, name: str, data: bytes, if_generation_match: Optional[int] = None) -> int:
+        """Store ``data`` under ``name`` and return the new generation."""
+
+    @abstractmethod
+    def list(self, prefix: str, start_offset: Optional[str] = None) -> List[ObjectInfo]:
+        """
+        Return metadata of the objects whose name starts with ``prefix``,
+        sorted by name, skipping names lower than ``start_offset``.
+        """
+
+    def read_many(self, names: Iterable[str]) -> List[Optional[StoredObject]]:
+        """
+        Read several objects concurrently, in the order given.
+        """
+        futures = [submit_io(self.read, name) for name in names]
+        return [future.result() for future in futures]
+
+
+class GCSBackend(StorageBackend):
+    """
+    Every request has an explicit ``timeout`` (connect, read) and transient
+    errors (429, 5xx, connection resets) are retried with jittered exponential
+    backoff for up to ``retry_deadline`` seconds. Uploads are only retried
+    when they carry a generation precondition, since only those are
+    idempotent. Objects over 8 MiB (the storage library's multipart limit) are
+    sent as a resumable upload in ``upload_chunk_size`` chunks, so a failure
+    only resends the current chunk. All requests share one authorized session
+    whose connection pool fits the I/O thread pool.
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        service_account_info: dict,
+        timeout: Tuple[float, float] = (5.0, 30.0),
+        retry_deadline: float = 30.0,
+        pool_size: int = 10,
+        upload_chunk_size: int = 4 * 1024 * 1024,
+    ):
+        self.bucket_name = bucket_name
+        self.service_account_info = service_account_info
+        self.timeout = timeout
+        self.retry_deadline = retry_deadline
+        self.pool_size = pool_size
+        # GCS needs chunks in multiples of 256 KiB
+        self.upload_chunk_size = max(1, upload_chunk_size // (256 * 1024)) * 256 * 1024
+        self._bucket = None
+        self._retry = None
+
+    @property
+    def bucket(self):
+        # Built on first use so importing the app never needs GCS credentials
+        if self._bucket is None:
+            from google.auth.transport.requests import AuthorizedSession
+            from google.cloud import storage
+            from google.oauth2.service_account import Credentials
+            from requests.adapters import HTTPAdapter
+
+            credentials = Credentials.from_service_account_info(
+                self.service_account_info,
+                scopes=["https://www.googleapis.com/auth/devstorage.read_write"],
+            )
+            session = AuthorizedSession(credentials)
+            session.mount(
+                "https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            )
+            client = storage.Client(
+                credentials=credentials,
+                project=self.service_account_info["project_id"],
+                _http=session,
+            )
+            self._bucket = client.bucket(self.bucket_name)
+        return self._bucket
+
+    @property
+    def retry(self):
+        if self._retry is None:
+            from google.cloud.storage.retry import DEFAULT_RETRY
+
+            self._retry = DEFAULT_RETRY.with_delay(initial=0.2, maximum=5.0, multiplier=2.0).with_deadline(
+                self.retry_deadline
+            )
+        return self._retry
+
+    def generation(self, name: str) -> Optional[int]:
+        blob = self.bucket.get_blob(name, timeout=self.timeout, retry=self.retry)
+        return None if blob is None else blob.generation
+
+    def read(self, name: str) -> Optional[StoredObject]:
+        from google.api_core.exceptions import NotFound
+
+        # No separate exists() call: a missing object is a NotFound download
+        blob = self.bucket.blob(name)
+        try:
+            data = blob.download_as_bytes(timeout=self.timeout, retry=self.retry)
+        except NotFound:
+            return None
+        return StoredObject(data, blob.generation)
+
+    def write(self, name: str, data: bytes, if_generation_match: Optional[int] = None) -> int:
+        from google.api_core import exceptions
+
+        blob = self.bucket.blob(name, chunk_size=self.upload_chunk_size)
+        try:
+            blob.upload_from_string(
+                data,
+                content_type="application/octet-stream",
+                if_generation_match=if_generation_match,
+                timeout=self.timeout,
+                retry=self.retry if if_generation_match is not None else None,
+            )
+        except exceptions.PreconditionFailed as e:
+            raise PreconditionFailed(name) from e
+        return blob.generation
+
+    def list(self, prefix: str, start_offset: Optional[str] = None) -> List[ObjectInfo]:
+        blobs = self.bucket.list_blobs(
+            prefix=prefix, start_offset=start_offset, timeout=self.timeout, retry=self.retry
+        )
+        return sorted(
+            (
+                ObjectInfo(
+                    blob.name,
+                    blob.generation,
+                    blob.size,
+                    blob.updated.timestamp() if blob.updated is not None else None,
+                )
+                for blob in blobs
+            ),
+            key=lambda info: info.name,
+        )
+
+
+class LocalFileBackend(StorageBackend):
+    """
+    Stores each object as a file under ``root``, in the same encrypted format
+    ``decode_data_json.py`` reads. The generation is the file's mtime in ns.
+    """
+
+    def __init__(self, root: str = "."):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def generation(self, name: str) -> Optional[int]:
+        try:
+            return os.stat(self._path(name)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def read(self, name: str) -> Optional[StoredObject]:
+        path = self._path(name)
+        try:
+            with open(path, "rb") as file:
+                generation = os.fstat(file.fileno()).st_mtime_ns
+                return StoredObject(file.read(), generation)
+        except FileNotFoundError:
+            return None
+
+    def write(self, name: str, data: bytes, if_generation_match: Optional[int] = None) -> int:
+        path = self._path(name)
+        with self._lock:
+            if if_generation_match is not None:
+                if (self.generation(name) or 0) != if_generation_match:
+                    raise PreconditionFailed(name)
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            previous = self.generation(name)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(data)
+            os.replace(tmp_path, path)
+            generation = self.generation(name)
+            if generation == previous:
+                # Coarse filesystem clocks: make sure the generation moves
+                generation = previous + 1
+                os.utime(path, ns=(generation, generation))
+            return generation
+
+    def list(self, prefix: str, start_offset: Optional[str] = None) -> List[ObjectInfo]:
+        objects = []
+        # Only walk the directory the prefix points into
+        for directory, _, files in os.walk(self._path(os.path.dirname(prefix))):
+            for file_name in files:
+                path = os.path.join(directory, file_name)
+                name = os.path.relpath(path, self.root).replace(os.sep, "/")
+                if not name.startswith(prefix) or name.endswith(".tmp"):
+                    continue
+                if start_offset is not None and name < start_offset:
+                    continue
+                stat = os.stat(path)
+                objects.append(ObjectInfo(name, stat.st_mtime_ns, stat.st_size, stat.st_mtime))
+        return sorted(objects, key=lambda info: info.name)
+
+
+class InMemoryBackend(StorageBackend):
+    """Process-local store, for benchmarks, load tests and local development."""
+
+    def __init__(self):
+        self._objects = {}
+        self._updated = {}
+        self._generations = count(1)
+        self._lock = threading.Lock()
+
+    def generation(self, name: str) -> Optional[int]:
+        stored = self._objects.get(name)
+        return None if stored is None else stored.generation
+
+    def read(self, name: str) -> Optional[StoredObject]:
+        return self._objects.get(name)
+
+    def read_many(self, names: Iterable[str]) -> List[Optional[StoredObject]]:
+        # Nothing to overlap in memory
+        return [self._objects.get(name) for name in names]
+
+    def write(self, name: str, data: bytes, if_generation_match: Optional[int] = None) -> int:
+        with self._lock:
+            if if_generation_match is not None:
+                if (self.generation(name) or 0) != if_generation_match:
+                    raise PreconditionFailed(name)
+            generation = next(self._generations)
+            self._objects[name] = StoredObject(bytes(data), generation)
+            self._updated[name] = time.time()
+            return generation
+
+    def list(self, prefix: str, start_offset: Optional[str] = None) -> List[ObjectInfo]:
+        return sorted(
+            (
+                ObjectInfo(name, stored.generation, len(stored.data), self._updated.get(name))
+                for name, stored in list(self._objects.items())
+                if name.startswith(prefix) and (start_offset is None or name >= start_offset)
+            ),
+            key=lambda info: info.name,
+        )
+
+
+class MeteredBackend(StorageBackend):
+    """
+    Wraps a backend and counts calls and bytes moved, for benchmarks and load
+    tests.
+    """
+
+    def __init__(self, backend: StorageBackend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = {"generation": 0, "read": 0, "write": 0, "list": 0}
+            self.bytes_read = 0
+            self.bytes_written = 0
+
+    def generation(self, name: str) -> Optional[int]:
+        with self._lock:
+            self.calls["generation"] += 1
+        return self.backend.generation(name)
+
+    def read(self, name: str) -> Optional[StoredObject]:
+        stored = self.backend.read(name)
+        with self._lock:
+            self.calls["read"] += 1
+            self.bytes_read += len(stored.data) if stored is not None else 0
+        return stored
+
+    def read_many(self, names: Iterable[str]) -> List[Optional[StoredObject]]:
+        objects = self.backend.read_many(names)
+        with self._lock:
+            self.calls["read"] += len(objects)
+            self.bytes_read += sum(len(stored.data) for stored in objects if stored is not None)
+        return objects
+
+    def write(self, name: str, data: bytes, if_generation_match: Optional[int] = None) -> int:
+        with self._lock:
+            self.calls["write"] += 1
+            self.bytes_written += len(data)
+        return self.backend.write(name, data, if_generation_match=if_generation_match)
+
+    def list(self, prefix: str, start_offset: Optional[str] = None) -> List[ObjectInfo]:
+        with self._lock:
+            self.calls["list"] += 1
+        return self.backend.list(prefix, start_offset=start_offset)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "bytes_read": self.bytes_read,
+                "bytes_written": self.bytes_written,
+            }
+
+
+def service_account_info_from_secrets(secrets: Mapping) -> dict:
+    """
+    Construct the service account key dictionary from the secrets.
+    """
+    google_credentials = secrets["google_credentials"]
+    return {
+        "type": google_credentials["type"],
+        "project_id": google_credentials["project_id"],
+        "private_key_id": google_credentials["private_key_id"],
+        "private_key": google_credentials["private_key"].replace("\\n", "\n"),
+        "client_email": google_credentials["client_email"],
+        "client_id": google_credentials["client_id"],
+        "auth_uri": google_credentials["auth_uri"],
+        "token_uri": google_credentials["token_uri"],
+        "auth_provider_x509_cert_url": google_credentials["auth_provider_x509_cert_url"],
+        "client_x509_cert_url": google_credentials["client_x509_cert_url"],
+    }
+
+
+def create_backend(secrets: Mapping) -> StorageBackend:
+    """
+    Pick the storage backend from the ``[storage]`` secrets section:
+    ``backend = "gcs"`` (default), ``"local"`` (with ``path``) or ``"memory"``.
+    """
+    config = secrets.get("storage", {})
+    kind = config.get("backend", "gcs")
+    if kind == "gcs":
+        return GCSBackend(
+            bucket_name=secrets["gcs"]["bucket_name"],
+            service_account_info=service_account_info_from_secrets(secrets),
+            timeout=(
+                float(config.get("connect_timeout_seconds", 5)),
+                float(config.get("read_timeout_seconds", 30)),
+            ),
+            retry_deadline=float(config.get("retry_deadline_seconds", 30)),
+        )
+    if kind == "local":
+        return LocalFileBackend(config.get("path", "."))
+    if kind == "memory":
+        return InMemoryBackend()
+    raise ValueError(f"Unknown storage backend: {kind}")
@@ -0,0 +1,124 @@
+import re
+import threading
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .backends import PreconditionFailed, StorageBackend
+from .document_store import ConflictError
+from .read_cache import ReadCache
+
+DEFAULT_BUDGET_ID = "default"
+
+
+def budget_document_name(budget_id: str) -> str:
+    return f"budgets/{budget_id}/budget.json"
+
+
+class BudgetIndex:
+    """
+    Small encrypted object listing every budget: its name, the emails that
+    can open it, its document name and the generation of its last snapshot.
+
+    Listing budgets only reads this object, never the budget documents. When
+    no index exists yet it lists the single legacy document as the default
+    budget, open to every allowed user (empty ``owners``).
+    """
+
+    def __init__(
+        self,
+        backend: StorageBackend,
+        name: str,
+        encrypt: Callable[[dict], bytes],
+        decrypt: Callable[[bytes], dict],
+        default_document: str,
+        cache: Optional[ReadCache] = None,
+        max_retries: int = 5,
+    ):
+        self.backend = backend
+        self.name = name
+        self.encrypt = encrypt
+        self.decrypt = decrypt
+        self.default_document = default_document
+        self.cache = cache or ReadCache()
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+
+    def _initial(self) -> dict:
+        return {
+            "budgets": {
+                DEFAULT_BUDGET_ID: {
+                    "name": "Matrimonio",
+                    "document": self.default_document,
+                    "owners": [],
+                    "generation": None,
+                }
+            }
+        }
+
+    def _fetch(self) -> Tuple[dict, Optional[int]]:
+        stored = self.backend.read(self.name)
+        if stored is None:
+            return self._initial(), None
+        return self.decrypt(stored.data), stored.generation
+
+    def entries(self) -> Dict[str, dict]:
+        """
+        Return ``{budget id: entry}``. The dicts are shared, do not mutate them.
+        """
+        return self.cache.get(lambda: self.backend.generation(self.name), self._fetch)["budgets"]
+
+    def budgets_for(self, email: str) -> List[Tuple[str, dict]]:
+        """
+        Return the ``(budget id, entry)`` pairs ``email`` can open, by name.
+        """
+        visible = [
+            (budget_id, entry)
+            for budget_id, entry in self.entries().items()
+            if not entry["owners"] or email in entry["owners"]
+        ]
+        return sorted(visible, key=lambda pair: pair[1]["name"].casefold())
+
+    def _update(self, mutate: Callable[[dict], None]):
+        # Read-modify-write guarded by the index generation
+        with self._lock:
+            for _ in range(self.max_retries):
+                index, generation = self._fetch()
+                mutate(index)
+                try:
+                    self.backend.write(
+                        self.name, self.encrypt(index), if_generation_match=generation or 0
+                    )
+                except PreconditionFailed:
+                    continue
+                self.cache.invalidate()
+                return
+        raise ConflictError(f"Could not update {self.name}")
+
+    def create(self, name: str, owners: List[str]) -> str:
+        """
+        Add a budget for ``owners`` and return its id.
+        """
+        slug = re.sub(r"[^a-z0-9]+", "-", name.casefold()).strip("-") or "budget"
+        budget_id = f"{slug}-{uuid.uuid4().hex[:8]}"
+
+        def mutate(index):
+            index["budgets"][budget_id] = {
+                "name": name,
+                "document": budget_document_name(budget_id),
+                "owners": sorted(set(owners)),
+                "generation": None,
+            }
+
+        self._update(mutate)
+        return budget_id
+
+    def record_generation(self, budget_id: str, generation: int):
+        """
+        Remember the generation of a budget's latest snapshot.
+        """
+
+        def mutate(index):
+            if budget_id in index["budgets"]:
+                index["budgets"][budget_id]["generation"] = generation
+
+        self._update(mutate)
@@ -0,0 +1,297 @@
+import logging
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from budget import FORMAT_VERSION, Budget, apply_changes, upgrade_changes
+from .backends import PreconditionFailed, StorageBackend, submit_io
+from .local_snapshot import LocalSnapshot
+from .read_cache import ReadCache
+
+logger = logging.getLogger(__name__)
+
+
+class ConflictError(Exception):
+    """Raised when a change could not be appended after ``max_retries`` attempts."""
+
+
+class StaleDataError(Exception):
+    """Raised when writing while the document cannot be loaded from storage."""
+
+
+def log_entry_name(name: str, seq: int) -> str:
+    return f"{name}.log/{seq:010d}"
+
+
+def log_entry_seq(entry_name: str) -> int:
+    return int(entry_name.rsplit("/", 1)[1])
+
+
+def checkpoint_name(name: str, seq: int) -> str:
+    return f"{name}.checkpoints/{seq:010d}"
+
+
+def read_log_entry(entry: dict) -> dict:
+    """
+    Return a decrypted log entry with its changes in the current format
+    (entries written before formats were versioned are version 2).
+    """
+    return {**entry, "changes": upgrade_changes(entry["changes"], entry.get("version", 2))}
+
+
+class DocumentStore:
+    """
+    Budget document stored as an encrypted snapshot plus an append-only log of
+    encrypted change entries, one small object per save.
+
+    Log entries are created with ``if_generation_match=0``, so two editors can
+    never claim the same sequence number: the loser re-reads the log tail and
+    retries with the next one, and since changes are keyed by item id they
+    merge on load. Every ``compact_every`` entries the log is folded into a new
+    snapshot, which records the last sequence number it includes in
+    ``log_seq``. Entries are never deleted, a stale writer can only ever fail
+    its precondition and retry. ``on_compact`` is called with the new
+    snapshot generation after each compaction.
+
+    Each entry records its author and time, and every snapshot is also kept
+    as a checkpoint named after its ``log_seq``, so any past version can be
+    rebuilt from the nearest checkpoint (see ``store.history``).
+
+    With a ``local_snapshot`` the first load is served from the local copy
+    while a background sync reconciles it with storage by version, and the
+    local copy is served (``offline`` is set) while storage is unreachable.
+    Writes are refused as long as the document cannot be loaded from storage.
+    """
+
+    def __init__(
+        self,
+        backend: StorageBackend,
+        name: str,
+        encrypt: Callable[[dict], bytes],
+        decrypt: Callable[[bytes], dict],
+        cache: Optional[ReadCache] = None,
+        compact_every: int = 20,
+        max_retries: int = 5,
+        on_compact: Optional[Callable[[int], None]] = None,
+        local_snapshot: Optional[LocalSnapshot] = None,
+    ):
+        self.backend = backend
+        self.name = name
+        self.encrypt = encrypt
+        self.decrypt = decrypt
+        self.cache = cache or ReadCache()
+        self.compact_every = compact_every
+        self.max_retries = max_retries
+        self.on_compact = on_compact
+        self.local_snapshot = local_snapshot
+        self.offline = False
+        self.last_error: Optional[Exception] = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._syncing = False
+        self._synced = False
+        self._snapshot_seq = 0
+        self._last_seq = 0
+
+    @property
+    def log_prefix(self) -> str:
+        return f"{self.name}.log/"
+
+    @property
+    def checkpoint_prefix(self) -> str:
+        return f"{self.name}.checkpoints/"
+
+    def _log_tail(self, after_seq: int):
+        return self.backend.list(
+            self.log_prefix, start_offset=log_entry_name(self.name, after_seq + 1)
+        )
+
+    def version(self) -> Tuple[Optional[int], int]:
+        """
+        Return ``(snapshot generation, last log sequence)`` from metadata only.
+        """
+        tail = self._log_tail(self._snapshot_seq)
+        last_seq = log_entry_seq(tail[-1].name) if tail else self._snapshot_seq
+        return self.backend.generation(self.name), last_seq
+
+    def _fetch(self) -> Tuple[Optional[Budget], Tuple[Optional[int], int]]:
+        # List the log tail while the snapshot downloads. Snapshots only move
+        # forward, so the tail after the last known snapshot covers the new one.
+        tail_future = submit_io(self._log_tail, self._snapshot_seq)
+        stored = self.backend.read(self.name)
+        snapshot = self.decrypt(stored.data) if stored is not None else None
+        snapshot_seq = snapshot.get("log_seq", 0) if snapshot else 0
+        tail = [info for info in tail_future.result() if log_entry_seq(info.name) > snapshot_seq]
+
+        budget = Budget.from_dict(snapshot) if snapshot is not None or tail else None
+        last_seq = snapshot_seq
+        entries = self.backend.read_many([info.name for info in tail])
+        for info, entry in zip(tail, entries):
+            if entry is None:
+                continue
+            apply_changes(budget, read_log_entry(self.decrypt(entry.data))["changes"])
+            last_seq = log_entry_seq(info.name)
+
+        self._snapshot_seq = snapshot_seq
+        self._last_seq = max(self._last_seq, last_seq)
+        generation = stored.generation if stored is not None else None
+        if self.local_snapshot is not None and budget is not None:
+            self.local_snapshot.write(budget, (generation, last_seq), snapshot_seq)
+        return budget, (generation, last_seq)
+
+    def _load_remote(self) -> Optional[Budget]:
+        try:
+            budget = self.cache.get(self.version, self._fetch)
+        except Exception as e:
+            self.last_error = e
+            raise
+        self.last_error = None
+        self.offline = False
+        self._synced = True
+        return budget
+
+    def _sync(self, local_copy):
+        try:
+            # Same version in storage: the local copy is current, no download
+            self._snapshot_seq = local_copy.snapshot_seq
+            if self.version() == local_copy.version:
+                self._last_seq = max(self._last_seq, local_copy.version[1])
+                self.cache.prime(local_copy.budget, local_copy.version)
+                self.last_error = None
+                self.offline = False
+                self._synced = True
+            else:
+                self._load_remote()
+        except Exception as e:
+            self.last_error = e
+            logger.warning("Background sync of %s failed: %s", self.name, e)
+        finally:
+            with self._sync_lock:
+                self._syncing = False
+
+    def _start_sync(self, local_copy):
+        with self._sync_lock:
+            if self._syncing:
+                return
+            self._syncing = True
+        threading.Thread(
+            target=self._sync, args=(local_copy,), name="snapshot-sync", daemon=True
+        ).start()
+
+    def load(self) -> Optional[Budget]:
+        """
+        Return the current budget, or None if nothing was ever saved.
+
+        The returned object is shared with the cache and must not be mutated.
+        """
+        if self.local_snapshot is None:
+            return self._load_remote()
+
+        if not self._synced:
+            # Cold start, storage not reached yet: serve the local copy now
+            local_copy = self.local_snapshot.read()
+            if local_copy is not None:
+                self.offline = True
+                self._start_sync(local_copy)
+                return local_copy.budget
+        try:
+            return self._load_remote()
+        except Exception:
+            local_copy = self.local_snapshot.read()
+            if local_copy is None:
+                raise
+            self.offline = True
+            return local_copy.budget
+
+    def poll(self) -> int:
+        """
+        Look for changes in storage and return the cache's ``revision``.
+
+        Shared by every session of the process, so storage sees at most one
+        metadata check per cache TTL however many sessions poll.
+        """
+        try:
+            self.load()
+        except Exception:
+            # Reported by the next regular load
+            pass
+        return self.cache.revision
+
+    def append(self, changes: List[dict], author: Optional[str] = None) -> int:
+        """
+        Append ``changes`` to the log on behalf of ``author`` (an email) and
+        return their sequence number.
+        """
+        if self.last_error is not None:
+            # Never write on top of a document we could not read: try again,
+            # and refuse if storage is still failing
+            try:
+                self._load_remote()
+            except Exception as e:
+                raise StaleDataError(f"Cannot save, {self.name} could not be loaded: {e}") from e
+        with self._lock:
+            for _ in range(self.max_retries):
+                seq = self._last_seq + 1
+                payload = self.encrypt(
+                    {
+                        "seq": seq,
+                        "version": FORMAT_VERSION,
+                        "author": author,
+                        "time": time.time(),
+                        "changes": changes,
+                    }
+                )
+                try:
+                    self.backend.write(
+                        log_entry_name(self.name, seq), payload, if_generation_match=0
+                    )
+                except PreconditionFailed:
+                    # Another editor took this sequence number, catch up and retry
+                    tail = self._log_tail(seq)
+                    self._last_seq = log_entry_seq(tail[-1].name) if tail else seq
+                    continue
+                self._last_seq = seq
+                self.cache.invalidate()
+                if seq - self._snapshot_seq >= self.compact_every:
+                    self.compact()
+                return seq
+        raise ConflictError(f"Could not append changes to {self.name}")
+
+    def _checkpoint(self, seq: int, data: bytes):
+        try:
+            self.backend.write(checkpoint_name(self.name, seq), data, if_generation_match=0)
+        except PreconditionFailed:
+            # Same version already checkpointed by another writer
+            pass
+
+    def compact(self):
+        """
+        Fold the log into a new snapshot. Losing the race to another compaction
+        is harmless, the log still holds every change.
+        """
+        budget, (generation, last_seq) = self._fetch()
+        if budget is None:
+            return
+        if self.backend.generation(checkpoint_name(self.name, self._snapshot_seq)) is None:
+            if generation is None:
+                # No snapshot yet (e.g. a new budget): the history starts
+                # from an empty budget
+                self._checkpoint(0, self.encrypt(Budget().to_dict()))
+            else:
+                # The snapshot being replaced predates checkpoints (e.g. the
+                # original document): keep it, it is the base of the history
+                stored = self.backend.read(self.name)
+                if stored is not None and stored.generation == generation:
+                    self._checkpoint(self._snapshot_seq, stored.data)
+        snapshot = budget.to_dict()
+        snapshot["log_seq"] = last_seq
+        data = self.encrypt(snapshot)
+        try:
+            generation = self.backend.write(self.name, data, if_generation_match=generation or 0)
+        except PreconditionFailed:
+            return
+        self._checkpoint(last_seq, data)
+        self._snapshot_seq = last_seq
+        self.cache.invalidate()
+        if self.on_compact is not None:
+            self.on_compact(generation)
@@ -0,0 +1,198 @@
+import base64
+import hashlib
+import json
+import os
+import struct
+import zlib
+from typing import List, Sequence
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# Envelope layout (version 2):
+#   MAGIC | version (1 byte) | mode (1 byte) | codec (1 byte) | body
+#
+# MODE_FERNET body: the Fernet token, base64-decoded (no 33% inflation).
+# MODE_AEAD body:   key id (4) | nonce prefix (8) | chunk size (4) | frames,
+#   each frame is length (4) | AES-256-GCM ciphertext of one chunk. The
+#   header up to the first frame, the chunk index and a "last chunk" flag are
+#   authenticated, so the header cannot be altered and chunks cannot be
+#   reordered or dropped. There is always at least one frame.
+#
+# Version 1 is the same without the header in the authenticated data; it is
+# still read. Anything not starting with MAGIC is a legacy document: a plain
+# Fernet token of the JSON text.
+MAGIC = b"\x00WBE"
+VERSION = 2
+READ_VERSIONS = (1, 2)
+AEAD_HEADER_SIZE = 7 + 16
+MODE_FERNET = 1
+MODE_AEAD = 2
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+
+AEAD_KEY_INFO = b"wedding-budget-app/aead/v1"
+
+
+class EnvelopeError(Exception):
+    """Raised when a document cannot be decrypted with any configured key."""
+
+
+def _aead_key(fernet_key: str) -> bytes:
+    return HKDF(
+        algorithm=hashes.SHA256(), length=32, salt=None, info=AEAD_KEY_INFO
+    ).derive(base64.urlsafe_b64decode(fernet_key))
+
+
+class Envelope:
+    """
+    Versioned, compressed encryption format for the budget documents.
+
+    ``keys`` are Fernet keys, newest first: everything is written with the
+    first one and read with any of them, so rotating a key starts with putting
+    the new one in front. The snapshot moves to the new key at the next
+    compaction; log entries, checkpoints and attachments are never rewritten
+    by the app, ``needs_rotation`` and ``rotate`` let ``rotate_key.py`` move
+    them before the old key is removed.
+
+    Payloads are zlib-compressed before encryption, unless they are already
+    compressed (``compress=False``, e.g. images and PDFs). Payloads larger than
+    ``aead_threshold`` bytes after compression are encrypted in
+    ``chunk_size`` AES-GCM chunks instead of a single Fernet token.
+    """
+
+    def __init__(
+        self,
+        keys: Sequence[str],
+        compression_level: int = 6,
+        aead_threshold: int = 1024 * 1024,
+        chunk_size: int = 256 * 1024,
+    ):
+        if not keys:
+            raise ValueError("At least one encryption key is required")
+        fernets = [Fernet(key.encode() if isinstance(key, str) else key) for key in keys]
+        self.fernet = MultiFernet(fernets)
+        self._primary_fernet = fernets[0]
+        self.compression_level = compression_level
+        self.aead_threshold = aead_threshold
+        self.chunk_size = chunk_size
+        self._aead_keys = {}
+        for key in keys:
+            key = key.decode() if isinstance(key, bytes) else key
+            derived = _aead_key(key)
+            self._aead_keys[hashlib.sha256(derived).digest()[:4]] = AESGCM(derived)
+        self._primary_key_id = next(iter(self._aead_keys))
+
+    def encrypt(self, plaintext: bytes, compress: bool = True) -> bytes:
+        if compress:
+            body, codec = zlib.compress(plaintext, self.compression_level), CODEC_ZLIB
+        else:
+            body, codec = plaintext, CODEC_NONE
+        header = MAGIC + bytes([VERSION])
+        if len(body) <= self.aead_threshold:
+            token = base64.urlsafe_b64decode(self.fernet.encrypt(body))
+            return header + bytes([MODE_FERNET, codec]) + token
+        return self._encrypt_chunks(header + bytes([MODE_AEAD, codec]), body)
+
+    def _encrypt_chunks(self, header: bytes, data: bytes) -> bytes:
+        nonce_prefix = os.urandom(8)
+        aead = self._aead_keys[self._primary_key_id]
+        header += self._primary_key_id + nonce_prefix + struct.pack(">I", self.chunk_size)
+        parts = [header]
+        chunk_count = max(1, -(-len(data) // self.chunk_size))
+        for index in range(chunk_count):
+            chunk = data[index * self.chunk_size:(index + 1) * self.chunk_size]
+            last = index == chunk_count - 1
+            nonce = nonce_prefix + struct.pack(">I", index)
+            ciphertext = aead.encrypt(nonce, chunk, header + struct.pack(">I?", index, last))
+            parts.append(struct.pack(">I", len(ciphertext)))
+            parts.append(ciphertext)
+        return b"".join(parts)
+
+    def decrypt(self, data: bytes) -> bytes:
+        if not data.startswith(MAGIC):
+            # Legacy document: a Fernet token of the uncompressed JSON
+            return self.fernet.decrypt(data)
+
+        version, mode, codec = data[4], data[5], data[6]
+        if version not in READ_VERSIONS:
+            raise EnvelopeError(f"Unsupported envelope version {version}")
+        body = data[7:]
+        if mode == MODE_FERNET:
+            compressed_chunks = [self.fernet.decrypt(base64.urlsafe_b64encode(body))]
+        elif mode == MODE_AEAD:
+            # Version 1 did not authenticate the header
+            compressed_chunks = self._decrypt_chunks(body, data[:AEAD_HEADER_SIZE] if version >= 2 else b"")
+        else:
+            raise EnvelopeError(f"Unsupported envelope mode {mode}")
+
+        if codec == CODEC_NONE:
+            return b"".join(compressed_chunks)
+        if codec != CODEC_ZLIB:
+            raise EnvelopeError(f"Unsupported envelope codec {codec}")
+        # Decompress chunk by chunk, never holding two copies of the whole body
+        decompressor = zlib.decompressobj()
+        plaintext = [decompressor.decompress(chunk) for chunk in compressed_chunks]
+        plaintext.append(decompressor.flush())
+        return b"".join(plaintext)
+
+    def _decrypt_chunks(self, body: bytes, header: bytes) -> List[bytes]:
+        key_id, nonce_prefix = body[:4], body[4:12]
+        aead = self._aead_keys.get(key_id)
+        if aead is None:
+            raise EnvelopeError("Document was encrypted with an unknown key")
+        if len(body) <= 16:
+            # Every document has at least one chunk: all of them were stripped
+            raise EnvelopeError("Document has no encrypted chunks")
+        chunks = []
+        offset = 16
+        index = 0
+        while offset < len(body):
+            (length,) = struct.unpack_from(">I", body, offset)
+            ciphertext = body[offset + 4:offset + 4 + length]
+            offset += 4 + length
+            last = offset >= len(body)
+            nonce = nonce_prefix + struct.pack(">I", index)
+            chunks.append(aead.decrypt(nonce, ciphertext, header + struct.pack(">I?", index, last)))
+            index += 1
+        return chunks
+
+    def needs_rotation(self, data: bytes) -> bool:
+        """
+        Whether ``data`` was written with a previous key or in an older
+        format, and should be rewritten with ``rotate``.
+        """
+        if not data.startswith(MAGIC) or data[4] != VERSION:
+            return True
+        if data[5] == MODE_AEAD:
+            return data[7:11] != self._primary_key_id
+        try:
+            self._primary_fernet.decrypt(base64.urlsafe_b64encode(data[7:]))
+        except InvalidToken:
+            return True
+        return False
+
+    def rotate(self, data: bytes) -> bytes:
+        """
+        Re-encrypt ``data`` with the current key and format, keeping its
+        compression.
+        """
+        compress = not data.startswith(MAGIC) or data[6] != CODEC_NONE
+        return self.encrypt(self.decrypt(data), compress=compress)
+
+    def encrypt_json(self, data) -> bytes:
+        return self.encrypt(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+
+    def decrypt_json(self, data: bytes):
+        return json.loads(self.decrypt(data).decode("utf-8"))
+
+
+def envelope_from_secrets(secrets) -> Envelope:
+    """
+    Build the envelope from ``[encryption]``: ``key`` is the current key and
+    the optional ``previous_keys`` list holds the keys being rotated out.
+    """
+    encryption = secrets["encryption"]
+    return Envelope([encryption["key"], *encryption.get("previous_keys", [])])
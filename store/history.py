@@ -0,0 +1,142 @@
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+
+from budget import Budget, apply_changes, diff_attachments, diff_budgets, diff_installments
+from .document_store import DocumentStore, checkpoint_name, log_entry_name, log_entry_seq, read_log_entry
+
+
+class Version(NamedTuple):
+    """A saved version, as listed from object metadata only."""
+    seq: int
+    updated: Optional[float]
+    size: int
+
+
+class VersionDetail(NamedTuple):
+    """The decrypted log entry of a version."""
+    seq: int
+    author: Optional[str]
+    time: Optional[float]
+    changes: List[dict]
+
+
+class History:
+    """
+    Past versions of a ``DocumentStore`` document, one per log entry.
+
+    Listing versions only reads object metadata. A log entry is downloaded and
+    decrypted the first time its version is opened, and kept since entries
+    never change. The budget at a version is rebuilt from the closest state
+    already rebuilt (or checkpoint) before it, so stepping through consecutive
+    versions applies a single entry each time. Versions older than the oldest
+    checkpoint of a document compacted before checkpoints existed cannot be
+    rebuilt.
+    """
+
+    def __init__(self, document_store: DocumentStore, max_states: int = 16):
+        self.document_store = document_store
+        self.backend = document_store.backend
+        self.max_states = max_states
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._states = OrderedDict()
+
+    def versions(self) -> List[Version]:
+        """
+        Return every saved version, oldest first.
+        """
+        return [
+            Version(log_entry_seq(info.name), info.updated, info.size)
+            for info in self.backend.list(self.document_store.log_prefix)
+        ]
+
+    def _load_entries(self, seqs: List[int]):
+        # Downloaded concurrently, decrypted as they are stored
+        missing = [seq for seq in seqs if seq not in self._entries]
+        names = [log_entry_name(self.document_store.name, seq) for seq in missing]
+        for seq, stored in zip(missing, self.backend.read_many(names)):
+            if stored is None:
+                continue
+            entry = read_log_entry(self.document_store.decrypt(stored.data))
+            self._entries[seq] = VersionDetail(
+                seq, entry.get("author"), entry.get("time"), entry["changes"]
+            )
+
+    def detail(self, seq: int) -> Optional[VersionDetail]:
+        """
+        Return who saved version ``seq``, when, and its changes.
+        """
+        with self._lock:
+            self._load_entries([seq])
+            return self._entries.get(seq)
+
+    def _base(self, seq: int):
+        """
+        Return ``(base seq, budget)`` for the closest known state at or
+        before ``seq``, or None if there is none.
+        """
+        cached = max((state_seq for state_seq in self._states if state_seq <= seq), default=None)
+        # Replaying a few small entries beats downloading a whole checkpoint
+        if cached is not None and seq - cached < self.document_store.compact_every:
+            self._states.move_to_end(cached)
+            return cached, self._states[cached].copy()
+
+        checkpoints = [
+            log_entry_seq(info.name)
+            for info in self.backend.list(self.document_store.checkpoint_prefix)
+        ]
+        checkpoint = max((cp_seq for cp_seq in checkpoints if cp_seq <= seq), default=None)
+        if cached is not None and (checkpoint is None or cached >= checkpoint):
+            self._states.move_to_end(cached)
+            return cached, self._states[cached].copy()
+        if checkpoint is not None:
+            stored = self.backend.read(checkpoint_name(self.document_store.name, checkpoint))
+            return checkpoint, Budget.from_dict(self.document_store.decrypt(stored.data))
+        if checkpoints:
+            return None
+
+        # Never compacted: the snapshot, if any, is the state before the log
+        stored = self.backend.read(self.document_store.name)
+        if stored is None:
+            return 0, Budget()
+        snapshot = self.document_store.decrypt(stored.data)
+        if snapshot.get("log_seq", 0) != 0:
+            return None
+        return 0, Budget.from_dict(snapshot)
+
+    def budget_at(self, seq: int) -> Optional[Budget]:
+        """
+        Return the budget as it was right after version ``seq`` was saved
+        (``seq=0`` is the state before the first logged change), or None if
+        it cannot be rebuilt.
+        """
+        with self._lock:
+            base = self._base(seq)
+            if base is None:
+                return None
+            base_seq, budget = base
+            self._load_entries(list(range(base_seq + 1, seq + 1)))
+            for entry_seq in range(base_seq + 1, seq + 1):
+                entry = self._entries.get(entry_seq)
+                if entry is not None:
+                    apply_changes(budget, entry.changes)
+            self._states[seq] = budget.copy()
+            self._states.move_to_end(seq)
+            while len(self._states) > self.max_states:
+                self._states.popitem(last=False)
+        return budget
+
+    def restore_changes(self, seq: int, current: Budget) -> Optional[List[dict]]:
+        """
+        Return the changes that bring ``current`` back to version ``seq``.
+        Saving them restores the version while keeping the history intact.
+        """
+        target = self.budget_at(seq)
+        if target is None:
+            return None
+        return (
+            diff_budgets(current, target)
+            + diff_attachments(current, target)
+            + diff_installments(current, target)
+        )
@@ -0,0 +1,51 @@
+import logging
+from typing import Callable, NamedTuple, Optional, Tuple
+
+from budget import Budget
+from .backends import LocalFileBackend
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCopy(NamedTuple):
+    budget: Budget
+    version: Tuple[Optional[int], int]
+    snapshot_seq: int
+
+
+class LocalSnapshot:
+    """
+    Encrypted on-disk copy of the last budget loaded from storage, in the same
+    format ``decode_data_json.py`` reads, plus the storage version it matches.
+    """
+
+    def __init__(
+        self,
+        backend: LocalFileBackend,
+        name: str,
+        encrypt: Callable[[dict], bytes],
+        decrypt: Callable[[bytes], dict],
+    ):
+        self.backend = backend
+        self.name = name
+        self.encrypt = encrypt
+        self.decrypt = decrypt
+
+    def read(self) -> Optional[LocalCopy]:
+        try:
+            stored = self.backend.read(self.name)
+            if stored is None:
+                return None
+            data = self.decrypt(stored.data)
+            generation, last_seq = data["source_version"]
+            return LocalCopy(Budget.from_dict(data), (generation, last_seq), data["snapshot_seq"])
+        except Exception as e:
+            # A corrupt or foreign local copy is just ignored
+            logger.warning("Ignoring local snapshot %s: %s", self.name, e)
+            return None
+
+    def write(self, budget: Budget, version: Tuple[Optional[int], int], snapshot_seq: int):
+        data = budget.to_dict()
+        data["source_version"] = list(version)
+        data["snapshot_seq"] = snapshot_seq
+        self.backend.write(self.name, self.encrypt(data))
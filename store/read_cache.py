@@ -0,0 +1,86 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Tuple
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    revalidations: int = 0
+
+
+class ReadCache:
+    """
+    Generation-aware cache for a single decoded document.
+
+    Within ``ttl_seconds`` the cached value is returned without touching
+    storage (a hit). After the TTL the current generation is checked with a
+    cheap metadata call: if it still matches, the entry is reused (a
+    revalidation), otherwise the document is downloaded again (a miss).
+
+    ``revision`` increases whenever the cached value moves to a different
+    generation, so readers sharing the cache can tell that the document
+    changed by comparing a number, without any I/O.
+    """
+
+    def __init__(self, ttl_seconds: float = 5.0, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._value = None
+        self._generation = None
+        self._checked_at = 0.0
+        self.revision = 0
+        # Kept across invalidate(), so refetching the same data is no change
+        self._revision_generation = None
+
+    def get(
+        self,
+        current_generation: Callable[[], Optional[int]],
+        fetch: Callable[[], Tuple[Any, Optional[int]]],
+    ) -> Any:
+        with self._lock:
+            now = self._clock()
+            if self._loaded:
+                if now - self._checked_at < self.ttl_seconds:
+                    self.stats.hits += 1
+                    return self._value
+                self.stats.revalidations += 1
+                if current_generation() == self._generation:
+                    self._checked_at = now
+                    return self._value
+
+            self.stats.misses += 1
+            value, generation = fetch()
+            self._store(value, generation)
+            return value
+
+    def _store(self, value: Any, generation: Optional[int]):
+        self._value = value
+        self._generation = generation
+        self._checked_at = self._clock()
+        self._loaded = True
+        if generation != self._revision_generation:
+            self._revision_generation = generation
+            self.revision += 1
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def prime(self, value: Any, generation: Optional[int]):
+        """
+        Store a value known to match ``generation`` without fetching it.
+        """
+        with self._lock:
+            self._store(value, generation)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+            self._value = None
+            self._generation = None
@@ -0,0 +1,68 @@
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from .backends import PreconditionFailed, StorageBackend
+from .document_store import ConflictError
+from .envelope import Envelope
+
+
+class RotationResult(NamedTuple):
+    checked: int
+    # Name of each rewritten object and its new generation
+    rotated: Dict[str, int]
+    # Name of each object that could not be rewritten and why
+    failed: Dict[str, str]
+
+
+def document_objects(backend: StorageBackend, document_name: str) -> list:
+    """
+    Return the names of a budget's objects: the snapshot, log entries,
+    checkpoints and attachments.
+    """
+    return [document_name] + [info.name for info in backend.list(f"{document_name}.")]
+
+
+def rotate_object(backend: StorageBackend, envelope: Envelope, name: str, max_retries: int = 5) -> Optional[int]:
+    """
+    Re-encrypt ``name`` with the current key if it still uses a previous one.
+    The write is guarded by the generation read, so an object changed in the
+    meantime (e.g. a snapshot replaced by a compaction) is read again rather
+    than overwritten. Return the new generation, or None if nothing changed.
+    """
+    for _ in range(max_retries):
+        stored = backend.read(name)
+        if stored is None or not envelope.needs_rotation(stored.data):
+            return None
+        try:
+            return backend.write(name, envelope.rotate(stored.data), if_generation_match=stored.generation)
+        except PreconditionFailed:
+            continue
+    raise ConflictError(f"Could not rotate {name}")
+
+
+def rotate_objects(
+    backend: StorageBackend, envelope: Envelope, names: Iterable[str], dry_run: bool = False
+) -> RotationResult:
+    """
+    Rewrite every object in ``names`` still using a previous key. With
+    ``dry_run`` only report them (with generation 0).
+    """
+    checked = 0
+    rotated = {}
+    failed = {}
+    for name in names:
+        checked += 1
+        try:
+            if dry_run:
+                stored = backend.read(name)
+                if stored is not None and envelope.needs_rotation(stored.data):
+                    # Decrypted too, so a missing key shows up in a dry run
+                    envelope.decrypt(stored.data)
+                    rotated[name] = 0
+                continue
+            generation = rotate_object(backend, envelope, name)
+        except Exception as e:
+            failed[name] = str(e) or type(e).__name__
+            continue
+        if generation is not None:
+            rotated[name] = generation
+    return RotationResult(checked, rotated, failed)
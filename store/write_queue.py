@@ -0,0 +1,141 @@
+import atexit
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import List, Optional
+
+from budget import coalesce_changes
+from .document_store import DocumentStore
+
+# Every live queue, so pending changes are flushed when the process exits
+_queues = weakref.WeakSet()
+
+
+@dataclass
+class FlushResult:
+    changes: int
+    latency: float
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class WriteBehindQueue:
+    """
+    Collects changes and writes them to a ``DocumentStore`` from a background
+    thread, one log entry per flush.
+
+    A flush starts once no change was submitted for ``delay`` seconds (or
+    ``max_delay`` after the first pending change). The worker thread only runs
+    while changes are pending, and keeps running until they are written even if
+    the session that submitted them has gone away. Failed flushes are retried
+    after ``retry_delay`` seconds. Results are collected for the UI to report
+    with ``drain_results``. Entries are recorded as written by ``author``.
+    """
+
+    def __init__(
+        self,
+        document_store: DocumentStore,
+        delay: float = 1.0,
+        max_delay: float = 5.0,
+        retry_delay: float = 5.0,
+        author: Optional[str] = None,
+    ):
+        self.document_store = document_store
+        self.author = author
+        self.delay = delay
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self._condition = threading.Condition()
+        self._pending: List[dict] = []
+        self._in_flight: List[dict] = []
+        self._results: List[FlushResult] = []
+        self._first_submit = 0.0
+        self._last_submit = 0.0
+        self._worker: Optional[threading.Thread] = None
+        _queues.add(self)
+
+    def submit(self, changes: List[dict]):
+        if not changes:
+            return
+        with self._condition:
+            now = time.monotonic()
+            if not self._pending:
+                self._first_submit = now
+            self._last_submit = now
+            self._pending.extend(changes)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._worker.start()
+            self._condition.notify_all()
+
+    def pending(self) -> List[dict]:
+        """
+        Return the changes not yet confirmed by storage, in submission order.
+        """
+        with self._condition:
+            return self._in_flight + self._pending
+
+    def drain_results(self) -> List[FlushResult]:
+        with self._condition:
+            results, self._results = self._results, []
+            return results
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Write pending changes now and wait until nothing is left pending.
+        Return False if that did not happen within ``timeout`` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._first_submit = self._last_submit = float("-inf")
+            self._condition.notify_all()
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def _due_in(self) -> float:
+        now = time.monotonic()
+        return min(self._last_submit + self.delay, self._first_submit + self.max_delay) - now
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending and self._due_in() > 0:
+                    self._condition.wait(self._due_in())
+                if not self._pending:
+                    self._worker = None
+                    return
+                self._in_flight = coalesce_changes(self._pending)
+                self._pending = []
+                changes = self._in_flight
+
+            started = time.perf_counter()
+            error = None
+            try:
+                if changes:
+                    self.document_store.append(changes, author=self.author)
+            except Exception as e:
+                error = str(e)
+            result = FlushResult(len(changes), time.perf_counter() - started, error)
+
+            with self._condition:
+                self._results.append(result)
+                if error is not None:
+                    # Put the changes back in front and retry later
+                    self._pending = self._in_flight + self._pending
+                    self._first_submit = self._last_submit = time.monotonic() + self.retry_delay
+                self._in_flight = []
+                self._condition.notify_all()
+
+
+@atexit.register
+def _flush_all_queues():
+    for queue in list(_queues):
+        queue.flush(timeout=10)
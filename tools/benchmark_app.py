@@ -0,0 +1,253 @@
+"""
+Headless benchmark of the whole app: drives main.py through Streamlit's
+AppTest (login, idle rerun, add, edit, remove, export) against an in-memory
+storage backend seeded with budgets of several sizes, and writes a JSON report
+with rerun latency, storage traffic, encrypt/decrypt time and peak memory.
+
+    python tools/benchmark_app.py [report.json] [--sizes 10,100,1000] [--reruns 5]
+
+No Google credentials or network are needed: secrets are stubbed, the cookie
+manager is replaced by an in-process fake holding a signed session token, and
+the storage backend is a metered InMemoryBackend.
+"""
+import argparse
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import extra_streamlit_components as stx
+import jwt
+import streamlit as st
+from cryptography.fernet import Fernet
+from streamlit import logger as streamlit_logger
+from streamlit.testing.v1 import AppTest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import store  # noqa: E402
+from budget import Budget  # noqa: E402
+from store import InMemoryBackend, MeteredBackend  # noqa: E402
+from store.envelope import Envelope  # noqa: E402
+
+SIZES = [10, 100, 1000]
+RERUNS = 5
+EMAIL = "bench@example.com"
+TOKEN_KEY = "benchmark-token-key"
+ENCRYPTION_KEY = Fernet.generate_key().decode()
+DOCUMENT_NAME = "data.json"
+
+SECRETS = {
+    "google_oauth_credentials": {
+        "allowed_users": EMAIL,
+        "google_client_id": "benchmark",
+        "google_client_secret": "benchmark",
+        "redirect_uri": "http://localhost:8501/",
+        "token_key": TOKEN_KEY,
+        "project_id": "benchmark",
+    },
+    "encryption": {"key": ENCRYPTION_KEY},
+    # Saves go out as soon as they are queued, flushed explicitly below
+    "storage": {"backend": "memory", "write_delay_seconds": 0},
+}
+
+
+class FakeCookieManager:
+    """
+    Stands in for the browser cookie component with an already signed-in user.
+    """
+
+    cookies = {}
+
+    def __init__(self, key="init"):
+        pass
+
+    def get(self, cookie):
+        return self.cookies.get(cookie)
+
+    def get_all(self, key="get_all"):
+        return dict(self.cookies)
+
+    def set(self, cookie, value, **kwargs):
+        self.cookies[cookie] = value
+
+    def delete(self, cookie, **kwargs):
+        self.cookies.pop(cookie, None)
+
+
+class CryptoTimer:
+    """
+    Accumulates time spent in Envelope.encrypt_json and decrypt_json.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.totals = {"encrypt": [0, 0.0], "decrypt": [0, 0.0]}
+
+    def wrap(self, kind, method):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                entry = self.totals[kind]
+                entry[0] += 1
+                entry[1] += time.perf_counter() - started
+
+        return timed
+
+    def report(self):
+        return {
+            kind: {"calls": calls, "total_ms": round(seconds * 1000, 3)}
+            for kind, (calls, seconds) in self.totals.items()
+        }
+
+
+def session_token():
+    claims = {"email": EMAIL, "oauth_id": "benchmark", "exp": time.time() + 3600}
+    return jwt.encode(claims, TOKEN_KEY, algorithm="HS256")
+
+
+def seeded_backend(size):
+    budget = Budget()
+    for idx in range(size):
+        budget.add(
+            f"Categoria {idx}",
+            estimated_budget=idx * 1000,
+            actual_budget=idx * 900,
+            note=f"Nota {idx}",
+            paid_by="Sposi",
+        )
+    backend = MeteredBackend(InMemoryBackend())
+    backend.write(DOCUMENT_NAME, Envelope([ENCRYPTION_KEY]).encrypt_json(budget.to_dict()))
+    backend.reset()
+    return backend
+
+
+def button(app, label):
+    return next(widget for widget in app.button if widget.label == label)
+
+
+def flush_writes(app):
+    for write_queue in app.session_state["write_queues"].values():
+        write_queue.flush(timeout=60)
+    # Pick up the saved budget, so the next step edits the grid as now shown
+    app.run()
+
+
+def run_scenario(size, reruns, crypto_timer):
+    # Every scenario starts from a cold process: no cached backend or stores
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    backend = seeded_backend(size)
+    store.create_backend = lambda secrets: backend
+    FakeCookieManager.cookies = {"auth_jwt": session_token()}
+    crypto_timer.reset()
+
+    app = AppTest.from_file(str(ROOT / "main.py"), default_timeout=600)
+    for section, values in SECRETS.items():
+        app.secrets[section] = values
+
+    steps = {}
+
+    def step(name, action, flush=False):
+        before = backend.stats()
+        started = time.perf_counter()
+        action()
+        if flush:
+            flush_writes(app)
+        elapsed = time.perf_counter() - started
+        if app.exception:
+            raise RuntimeError(f"{name} failed: {app.exception[0].value}")
+        after = backend.stats()
+        record = steps.setdefault(name, {"runs_ms": [], "bytes_read": 0, "bytes_written": 0})
+        record["runs_ms"].append(round(elapsed * 1000, 3))
+        record["bytes_read"] += after["bytes_read"] - before["bytes_read"]
+        record["bytes_written"] += after["bytes_written"] - before["bytes_written"]
+        # Every step that saves must reach storage, or it did not do what it says
+        if flush and after["bytes_written"] == before["bytes_written"]:
+            raise RuntimeError(f"{name} wrote nothing to storage")
+
+    tracemalloc.start()
+    try:
+        step("login", app.run)
+        for _ in range(reruns):
+            step("rerun", app.run)
+
+        def add():
+            inputs = {widget.label: widget for widget in app.text_input}
+            inputs["Nome Categoria"].input("Fiori")
+            next(widget for widget in app.number_input if widget.label == "Budget Stimato").set_value(500)
+            button(app, "Aggiungi Categoria").click().run()
+
+        step("add", add, flush=True)
+
+        def edit_grid(edit):
+            budget = app.session_state["budget"]
+            app.session_state[f"budget_editor_{budget.fingerprint()}"] = edit
+            button(app, "Salva Modifiche").click().run()
+
+        step("edit", lambda: edit_grid(
+            {"edited_rows": {"0": {"Note": "Modificata"}}, "added_rows": [], "deleted_rows": []}
+        ), flush=True)
+        step("remove", lambda: edit_grid(
+            {"edited_rows": {}, "added_rows": [], "deleted_rows": [0]}
+        ), flush=True)
+        step("export", lambda: button(app, "Prepara esportazione").click().run())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    for record in steps.values():
+        record["median_ms"] = round(statistics.median(record["runs_ms"]), 3)
+    return {
+        "items": size,
+        "steps": steps,
+        "storage": backend.stats(),
+        "crypto": crypto_timer.report(),
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("report", nargs="?", default="benchmark_report.json", help="where to write the JSON report")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma separated budget sizes")
+    parser.add_argument("--reruns", type=int, default=RERUNS, help="idle reruns measured per size")
+    args = parser.parse_args()
+
+    # AppTest logs every rerun at debug level
+    streamlit_logger.set_log_level(logging.ERROR)
+    stx.CookieManager = FakeCookieManager
+    crypto_timer = CryptoTimer()
+    Envelope.encrypt_json = crypto_timer.wrap("encrypt", Envelope.encrypt_json)
+    Envelope.decrypt_json = crypto_timer.wrap("decrypt", Envelope.decrypt_json)
+
+    scenarios = []
+    print(f"{'items':>6} {'login':>10} {'rerun':>10} {'add':>10} {'edit':>10} {'remove':>10} {'export':>10} {'peak KiB':>10}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        scenario = run_scenario(size, args.reruns, crypto_timer)
+        scenarios.append(scenario)
+        medians = " ".join(f"{step['median_ms']:>10.1f}" for step in scenario["steps"].values())
+        print(f"{size:>6} {medians} {scenario['peak_memory_kib']:>10.0f}")
+
+    report = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "streamlit": st.__version__,
+        "reruns": args.reruns,
+        "scenarios": scenarios,
+    }
+    Path(args.report).write_text(json.dumps(report, indent=2))
+    print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Payload size and encrypt/decrypt time of the legacy format (one Fernet token
+of the JSON text) against the compressed envelope, in Fernet and chunked
+AES-GCM mode, for budgets of 1k to 100k items.
+
+    python tools/benchmark_crypto.py
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from budget import Budget  # noqa: E402
+from store.envelope import Envelope  # noqa: E402
+
+SIZES = [1_000, 10_000, 100_000]
+
+
+def make_document(size: int) -> dict:
+    budget = Budget()
+    for idx in range(size):
+        budget.add(
+            f"Categoria {idx}",
+            estimated_budget=idx * 10,
+            actual_budget=idx * 9,
+            note=f"Nota per la categoria {idx}",
+            paid_by="Sposi" if idx % 2 else "Famiglia",
+            payment_done=bool(idx % 3),
+        )
+    return budget.to_dict()
+
+
+def measure(encrypt, decrypt, document):
+    started = time.perf_counter()
+    payload = encrypt(document)
+    encrypted = time.perf_counter()
+    decrypt(payload)
+    decrypted = time.perf_counter()
+    return len(payload), encrypted - started, decrypted - encrypted
+
+
+def main():
+    key = Fernet.generate_key()
+    fernet = Fernet(key)
+    formats = {
+        "legacy": (
+            lambda data: fernet.encrypt(json.dumps(data).encode("utf-8")),
+            lambda payload: json.loads(fernet.decrypt(payload)),
+        ),
+        "envelope": (Envelope([key.decode()]).encrypt_json, Envelope([key.decode()]).decrypt_json),
+        "envelope-aead": (
+            Envelope([key.decode()], aead_threshold=0).encrypt_json,
+            Envelope([key.decode()], aead_threshold=0).decrypt_json,
+        ),
+    }
+
+    print(f"{'items':>8} {'format':>14} {'size (KiB)':>12} {'encrypt (ms)':>14} {'decrypt (ms)':>14}")
+    for size in SIZES:
+        document = make_document(size)
+        for name, (encrypt, decrypt) in formats.items():
+            payload_size, encrypt_time, decrypt_time = measure(encrypt, decrypt, document)
+            print(
+                f"{size:>8} {name:>14} {payload_size / 1024:>12.1f} "
+                f"{encrypt_time * 1000:>14.1f} {decrypt_time * 1000:>14.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compare rerun time of the old per-category widget loop with the single
+st.data_editor grid, at several budget sizes, using Streamlit's AppTest.
+
+    python tools/benchmark_editor.py
+"""
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+SIZES = [10, 100, 1000]
+RERUNS = 5
+
+SETUP = """
+import streamlit as st
+from budget import Budget
+
+budget = Budget()
+for idx in range({size}):
+    budget.add(f"Categoria {{idx}}", estimated_budget=idx * 10, actual_budget=idx * 9)
+"""
+
+# Six widgets and two buttons per category, as before the grid editor
+LOOP_VIEW = SETUP + """
+for idx, item in enumerate(budget):
+    st.write(f"**Modifica Categoria {{idx + 1}}: {{item.category}}**")
+    st.text_input(f"Nome {{idx}}", value=item.category, key=f"category_{{item.id}}")
+    st.number_input(f"Stimato {{idx}}", min_value=0, value=item.estimated_budget, key=f"estimated_budget_{{item.id}}")
+    st.number_input(f"Reale {{idx}}", min_value=0, value=item.actual_budget, key=f"actual_budget_{{item.id}}")
+    st.text_input(f"Note {{idx}}", value=item.note, key=f"note_{{item.id}}")
+    st.text_input(f"Pagato Da {{idx}}", value=item.paid_by, key=f"paid_by_{{item.id}}")
+    st.checkbox(f"Pagato {{idx}}", value=item.payment_done, key=f"payment_done_{{item.id}}")
+    st.button(f"Salva {{idx}}", key=f"save_{{item.id}}")
+    st.button(f"Rimuovi {{idx}}", key=f"remove_{{item.id}}")
+"""
+
+GRID_VIEW = SETUP + """
+from budget.frame import budget_to_frame
+
+st.data_editor(budget_to_frame(budget), key="budget_editor", num_rows="dynamic", hide_index=True)
+st.button("Salva Modifiche")
+"""
+
+
+def time_reruns(script: str) -> float:
+    app = AppTest.from_string(script, default_timeout=600)
+    app.run()
+    timings = []
+    for _ in range(RERUNS):
+        started = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    print(f"{'items':>6} {'loop (ms)':>12} {'grid (ms)':>12}")
+    for size in SIZES:
+        loop = time_reruns(LOOP_VIEW.format(size=size))
+        grid = time_reruns(GRID_VIEW.format(size=size))
+        print(f"{size:>6} {loop * 1000:>12.1f} {grid * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
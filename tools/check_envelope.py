@@ -0,0 +1,149 @@
+"""
+Check the encryption envelope: round trips in both modes, documents written
+by older versions, tampered documents (altered header, dropped, reordered or
+stripped chunks) being refused, and key rotation: once every object of a
+compacted budget with attachments is rotated, the old key can be removed.
+
+    python tools/check_envelope.py
+"""
+import os
+import struct
+import sys
+from pathlib import Path
+
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from budget import Budget, add_change, attach_change  # noqa: E402
+from store import (  # noqa: E402
+    AttachmentStore,
+    DocumentStore,
+    History,
+    InMemoryBackend,
+    document_objects,
+    rotate_object,
+    rotate_objects,
+)
+from store.envelope import AEAD_HEADER_SIZE, MAGIC, MODE_AEAD, Envelope, EnvelopeError  # noqa: E402
+
+
+def check(description, condition):
+    print(f"{'ok  ' if condition else 'FAIL'} {description}")
+    if not condition:
+        raise SystemExit(1)
+
+
+def refused(envelope, data):
+    try:
+        envelope.decrypt(data)
+    except (EnvelopeError, InvalidTag, InvalidToken):
+        return True
+    return False
+
+
+def frames(data):
+    body, offset, result = data[AEAD_HEADER_SIZE:], 0, []
+    while offset < len(body):
+        (length,) = struct.unpack_from(">I", body, offset)
+        result.append(body[offset:offset + 4 + length])
+        offset += 4 + length
+    return result
+
+
+def version_1(envelope, plaintext):
+    # As written before the header was authenticated: uncompressed AEAD chunks
+    key_id = envelope._primary_key_id
+    aead = envelope._aead_keys[key_id]
+    nonce_prefix = os.urandom(8)
+    chunks = [plaintext[idx:idx + envelope.chunk_size] for idx in range(0, len(plaintext), envelope.chunk_size)]
+    parts = [MAGIC, bytes([1, MODE_AEAD, 0]), key_id, nonce_prefix, struct.pack(">I", envelope.chunk_size)]
+    for index, chunk in enumerate(chunks):
+        aad = struct.pack(">I?", index, index == len(chunks) - 1)
+        ciphertext = aead.encrypt(nonce_prefix + struct.pack(">I", index), chunk, aad)
+        parts += [struct.pack(">I", len(ciphertext)), ciphertext]
+    return b"".join(parts)
+
+
+def check_rotation():
+    old_key, new_key = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+    backend = InMemoryBackend()
+    old = Envelope([old_key], aead_threshold=2048)
+    store = DocumentStore(backend, "budget.json", old.encrypt_json, old.decrypt_json, compact_every=3)
+    attachments = AttachmentStore(backend, "budget.json", old.encrypt, old.decrypt)
+    files = {}
+    for idx in range(5):
+        budget = Budget()
+        item = budget.add(f"Categoria {idx}")
+        attachment = attachments.upload(item.id, f"contratto-{idx}.pdf", os.urandom(1000 * idx + 10), "application/pdf")
+        files[attachment.id] = attachments.read(attachment.id)
+        store.append([add_change(item), attach_change(attachment)])
+    names = document_objects(backend, "budget.json")
+
+    rotating = Envelope([new_key, old_key], aead_threshold=2048)
+    check(f"all {len(names)} objects need rotation", all(rotating.needs_rotation(backend.read(name).data) for name in names))
+    dry_run = rotate_objects(backend, rotating, names, dry_run=True)
+    check("dry run rewrites nothing", len(dry_run.rotated) == len(names) and all(
+        rotating.needs_rotation(backend.read(name).data) for name in names
+    ))
+
+    # A write landing between the read and the rewrite is never overwritten
+    write = backend.write
+    racing = {"budget.json.log/0000000001": rotating.encrypt_json({"changes": [], "raced": True})}
+
+    def racing_write(name, data, if_generation_match=None):
+        if name in racing:
+            write(name, racing.pop(name))
+        return write(name, data, if_generation_match=if_generation_match)
+
+    backend.write = racing_write
+    check("rewrite skipped", rotate_object(backend, rotating, "budget.json.log/0000000001") is None)
+    backend.write = write
+    check("concurrent write kept", rotating.decrypt_json(backend.read("budget.json.log/0000000001").data).get("raced"))
+    backend.write("budget.json.log/0000000001", old.encrypt_json({"changes": [add_change(Budget().add("Categoria 0"))]}))
+
+    result = rotate_objects(backend, rotating, names)
+    check(f"{len(result.rotated)} objects rotated, none failed", not result.failed and len(result.rotated) == len(names))
+    check("second run has nothing left", not rotate_objects(backend, rotating, names).rotated)
+
+    new = Envelope([new_key], aead_threshold=2048)
+    reloaded = DocumentStore(backend, "budget.json", new.encrypt_json, new.decrypt_json, compact_every=3)
+    check("budget read without the old key", len(reloaded.load()) == 5)
+    history = History(reloaded)
+    check("every version rebuilt without the old key", [len(history.budget_at(seq)) for seq in range(6)] == list(range(6)))
+    attachments = AttachmentStore(backend, "budget.json", new.encrypt, new.decrypt)
+    check("attachments read without the old key", all(attachments.read(key) == data for key, data in files.items()))
+    check("old key refused afterwards", all(refused(old, backend.read(name).data) for name in names))
+
+
+def main():
+    key = Fernet.generate_key().decode()
+    fernet_envelope = Envelope([key])
+    envelope = Envelope([key], aead_threshold=0, chunk_size=1024)
+    plaintext = os.urandom(3000)
+    document = {"items": [{"category": f"Categoria {idx}"} for idx in range(200)]}
+
+    check("fernet round trip", fernet_envelope.decrypt_json(fernet_envelope.encrypt_json(document)) == document)
+    check("chunked round trip", envelope.decrypt(envelope.encrypt(plaintext, compress=False)) == plaintext)
+    check("chunked round trip of an empty file", envelope.decrypt(envelope.encrypt(b"", compress=False)) == b"")
+    check("legacy plain Fernet token read", envelope.decrypt(Fernet(key.encode()).encrypt(plaintext)) == plaintext)
+    check("version 1 chunks read", envelope.decrypt(version_1(envelope, plaintext)) == plaintext)
+
+    data = envelope.encrypt(plaintext, compress=False)
+    chunks = frames(data)
+    header = data[:AEAD_HEADER_SIZE]
+    check(f"{len(chunks)} chunks written", len(chunks) == 3)
+    check("all chunks stripped refused", refused(envelope, header))
+    check("last chunk dropped refused", refused(envelope, header + b"".join(chunks[:-1])))
+    check("chunks reordered refused", refused(envelope, header + chunks[1] + chunks[0] + chunks[2]))
+    check("codec altered refused", refused(envelope, data[:6] + bytes([1]) + data[7:]))
+    check("chunk size altered refused", refused(envelope, data[:19] + struct.pack(">I", 4096) + data[23:]))
+    check("unknown key refused", refused(Envelope([Fernet.generate_key().decode()]), data))
+
+    check_rotation()
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    main()
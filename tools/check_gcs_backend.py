@@ -0,0 +1,282 @@
+"""
+Exercise GCSBackend end to end against an in-process stub of the GCS JSON
+API: missing objects, generation preconditions, retries of transient errors
+and timeouts, chunked resumable uploads, concurrent reads and a DocumentStore
+round trip.
+
+    python tools/check_gcs_backend.py
+
+The stub also serves the OAuth token endpoint, so the real credentials,
+pooled authorized session and storage client are built exactly as in
+production; only the host differs (via STORAGE_EMULATOR_HOST).
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlparse
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+BUCKET = "budget-check"
+
+
+class FakeGCS:
+    """
+    Objects plus injected faults: ``faults[kind]`` is a list of actions
+    ("503" or a delay in seconds) consumed by the next requests of that kind.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.generation = 0
+        self.faults = {"download": [], "upload": [], "chunk": [], "metadata": [], "list": []}
+        self.requests = []
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def resource(self, name):
+        data, generation, updated = self.objects[name]
+        return {
+            "kind": "storage#object",
+            "name": name,
+            "bucket": BUCKET,
+            "generation": str(generation),
+            "metageneration": "1",
+            "size": str(len(data)),
+            "updated": updated.isoformat().replace("+00:00", "Z"),
+        }
+
+
+def make_handler(gcs):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def reply(self, status, body=b"", headers=None, content_type="application/json"):
+            if isinstance(body, dict):
+                body = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except BrokenPipeError:
+                # The client timed out first, as the timeout check intends
+                pass
+
+        def fault(self, kind):
+            with gcs.lock:
+                gcs.requests.append(kind)
+                action = gcs.faults[kind].pop(0) if gcs.faults[kind] else None
+            if action == "503":
+                self.reply(503, {"error": {"code": 503, "message": "backend unavailable"}})
+                return True
+            if action is not None:
+                time.sleep(action)
+            return False
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            match = re.fullmatch(rf"(/download)?/storage/v1/b/{BUCKET}/o(?:/(.+))?", url.path)
+            if match is None:
+                return self.reply(404, {"error": {"code": 404, "message": "no route"}})
+            download, name = match.group(1), match.group(2) and unquote(match.group(2))
+
+            if name is None:
+                if self.fault("list"):
+                    return
+                prefix = query.get("prefix", [""])[0]
+                start = query.get("startOffset", [""])[0]
+                with gcs.lock:
+                    items = [
+                        gcs.resource(key)
+                        for key in sorted(gcs.objects)
+                        if key.startswith(prefix) and key >= start
+                    ]
+                return self.reply(200, {"kind": "storage#objects", "items": items})
+
+            if self.fault("download" if download else "metadata"):
+                return
+            with gcs.lock:
+                if name not in gcs.objects:
+                    return self.reply(404, {"error": {"code": 404, "message": "No such object"}})
+                data, generation, _ = gcs.objects[name]
+                resource = gcs.resource(name)
+            if download:
+                return self.reply(
+                    200, data, {"x-goog-generation": str(generation)}, "application/octet-stream"
+                )
+            return self.reply(200, resource)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path == "/token":
+                self.rfile.read(int(self.headers["Content-Length"]))
+                return self.reply(200, {"access_token": "stub-token", "expires_in": 3600, "token_type": "Bearer"})
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            if self.fault("upload"):
+                return
+            query = parse_qs(url.query)
+            if query.get("uploadType") == ["resumable"]:
+                # Start a resumable session, the data follows in PUT requests
+                with gcs.lock:
+                    upload_id = str(len(gcs.sessions))
+                    gcs.sessions[upload_id] = (json.loads(body)["name"], query, bytearray())
+                location = f"http://{self.headers['Host']}{url.path}?uploadType=resumable&upload_id={upload_id}"
+                return self.reply(200, b"", {"Location": location})
+            boundary = re.search(r'boundary="?([^";]+)', self.headers["Content-Type"]).group(1).encode()
+            parts = [part for part in body.split(b"--" + boundary) if part.strip(b"-\r\n")]
+            metadata = json.loads(parts[0].split(b"\r\n\r\n", 1)[1])
+            data = parts[1].split(b"\r\n\r\n", 1)[1][: -len(b"\r\n")]
+            self.store(metadata.get("name") or query["name"][0], data, query)
+
+        def store(self, name, data, query):
+            with gcs.lock:
+                current = gcs.objects.get(name, (None, 0, None))[1]
+                if "ifGenerationMatch" in query and int(query["ifGenerationMatch"][0]) != current:
+                    return self.reply(412, {"error": {"code": 412, "message": "Precondition Failed"}})
+                gcs.generation += 1
+                gcs.objects[name] = (bytes(data), gcs.generation, datetime.now(timezone.utc))
+                resource = gcs.resource(name)
+            return self.reply(200, resource)
+
+        def do_PUT(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            upload_id = parse_qs(urlparse(self.path).query)["upload_id"][0]
+            name, query, received = gcs.sessions[upload_id]
+            if self.fault("chunk"):
+                return
+            match = re.fullmatch(r"bytes (\d+)-(\d+)/(\d+|\*)", self.headers["Content-Range"])
+            start, total = int(match.group(1)), match.group(3)
+            del received[start:]
+            received.extend(body)
+            if total != "*" and len(received) == int(total):
+                return self.store(name, received, query)
+            # Resume Incomplete: tell the client how much was persisted
+            return self.reply(308, b"", {"Range": f"bytes=0-{len(received) - 1}"})
+
+    return Handler
+
+
+def service_account_info(token_uri):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    return {
+        "type": "service_account",
+        "project_id": "budget-check",
+        "private_key_id": "stub",
+        "private_key": pem,
+        "client_email": "checker@budget-check.iam.gserviceaccount.com",
+        "client_id": "1",
+        "token_uri": token_uri,
+    }
+
+
+def check(description, condition):
+    print(f"{'ok  ' if condition else 'FAIL'} {description}")
+    if not condition:
+        raise SystemExit(1)
+
+
+def main():
+    gcs = FakeGCS()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(gcs))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"http://127.0.0.1:{server.server_port}"
+    os.environ["STORAGE_EMULATOR_HOST"] = host
+
+    from google.api_core import exceptions
+    from google.auth.transport.requests import AuthorizedSession
+
+    from store import DocumentStore, GCSBackend, PreconditionFailed
+    from budget import Budget, add_change
+
+    backend = GCSBackend(
+        BUCKET, service_account_info(f"{host}/token"), timeout=(1.0, 0.5), retry_deadline=10
+    )
+    session = backend.bucket.client._http
+    check("one pooled authorized session", isinstance(session, AuthorizedSession))
+    check("connection pool sized for the I/O pool", session.get_adapter("https://x")._pool_maxsize == backend.pool_size)
+
+    gcs.requests.clear()
+    check("missing object has no generation", backend.generation("missing") is None)
+    check("missing object reads as None", backend.read("missing") is None)
+    check("read is a single download request", gcs.requests == ["metadata", "download"])
+
+    generation = backend.write("doc", b"one", if_generation_match=0)
+    check("create-only write", backend.read("doc") == (b"one", generation))
+    try:
+        backend.write("doc", b"two", if_generation_match=0)
+        check("create-only write on an existing object fails", False)
+    except PreconditionFailed:
+        check("create-only write on an existing object fails", True)
+    check("conditional overwrite", backend.write("doc", b"two", if_generation_match=generation) > generation)
+
+    gcs.requests.clear()
+    gcs.faults["download"] = ["503", "503"]
+    check("download retried after two 503s", backend.read("doc").data == b"two")
+    check("three download attempts", gcs.requests == ["download"] * 3)
+
+    gcs.faults["download"] = [1.5]
+    check("download retried after a read timeout", backend.read("doc").data == b"two")
+
+    gcs.faults["upload"] = ["503"]
+    generation = backend.generation("doc")
+    check("conditional upload retried", backend.write("doc", b"three", if_generation_match=generation) > generation)
+
+    gcs.requests.clear()
+    gcs.faults["upload"] = ["503"]
+    try:
+        backend.write("doc", b"four")
+        check("unconditional upload is not retried", False)
+    except exceptions.ServiceUnavailable:
+        check("unconditional upload is not retried", gcs.requests == ["upload"])
+
+    for idx in range(8):
+        backend.write(f"many/{idx}", str(idx).encode(), if_generation_match=0)
+    listed = backend.list("many/", start_offset="many/3")
+    check("list honours prefix and start offset", [info.name for info in listed] == [f"many/{idx}" for idx in range(3, 8)])
+    check("list reports update time", all(info.updated for info in listed))
+
+    gcs.faults["download"] = [0.3] * 8
+    started = time.perf_counter()
+    objects = backend.read_many([f"many/{idx}" for idx in range(8)])
+    elapsed = time.perf_counter() - started
+    check("read_many keeps order", [stored.data for stored in objects] == [str(idx).encode() for idx in range(8)])
+    check(f"read_many runs concurrently ({elapsed:.2f}s for 8 x 0.3s)", elapsed < 1.2)
+
+    gcs.requests.clear()
+    gcs.faults["chunk"] = [None, "503"]
+    large = os.urandom(2 * backend.upload_chunk_size + 1024)
+    backend.write("large", large, if_generation_match=0)
+    check("large upload sent in resumable chunks", backend.read("large").data == large)
+    check("only the failed chunk is resent", gcs.requests.count("chunk") == 4)
+
+    encrypt = lambda data: json.dumps(data).encode()  # noqa: E731
+    store = DocumentStore(backend, "budget.json", encrypt, json.loads, compact_every=3)
+    for idx in range(5):
+        store.append([add_change(Budget().add(f"Categoria {idx}"))], author="checker@example.com")
+    reloaded = DocumentStore(backend, "budget.json", encrypt, json.loads).load()
+    check("document store round trip with compaction", sorted(item.category for item in reloaded) == [f"Categoria {idx}" for idx in range(5)])
+
+    server.shutdown()
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Check that bulk imports store amounts in the right currency: with a "Valuta"
+column, without one into categories kept in another currency, and for new
+categories.
+
+    python tools/check_importer.py
+"""
+import io
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from budget.changes import apply_changes  # noqa: E402
+from budget.importer import parse_import, plan_import, read_table  # noqa: E402
+from budget.model import Budget  # noqa: E402
+
+
+def check(description, condition):
+    print(f"{'ok  ' if condition else 'FAIL'} {description}")
+    if not condition:
+        raise SystemExit(1)
+
+
+def import_csv(budget, text):
+    result = parse_import(read_table(io.BytesIO(text.encode()), "import.csv"), budget)
+    if result.errors:
+        return result.errors
+    apply_changes(budget, plan_import(budget, result.rows))
+    return []
+
+
+def main():
+    budget = Budget()
+    hotel = budget.add("Hotel", currency="JPY", estimated_budget=100000)
+    catering = budget.add("Catering", estimated_budget=500000)
+
+    check("import without currency column", import_csv(budget, "Categoria,Budget Stimato\nhotel,1500\nCatering,\"5200,50\"\nFiori,300\n") == [])
+    check("amount scaled for the category's currency", (hotel.currency, hotel.estimated_budget) == ("JPY", 1500))
+    check("euro category keeps cents", (catering.currency, catering.estimated_budget) == ("EUR", 520050))
+    flowers = next(item for item in budget if item.category == "Fiori")
+    check("new category in euros", (flowers.currency, flowers.estimated_budget) == ("EUR", 30000))
+
+    errors = import_csv(budget, "Categoria,Budget Stimato\nHotel,\"1500,50\"\n")
+    check("decimals checked against the category's currency", len(errors) == 1 and "0 decimali" in errors[0])
+
+    check("import with currency column", import_csv(budget, "Categoria,Budget Stimato,Valuta\nHotel,1200,EUR\n") == [])
+    check("currency column changes the category's currency", (hotel.currency, hotel.estimated_budget) == ("EUR", 120000))
+
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    main()
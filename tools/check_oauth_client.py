@@ -0,0 +1,156 @@
+"""
+Exercise OAuthClient against an in-process stub of Google's OAuth token and
+userinfo endpoints: the authorization URL, the code exchange, the userinfo
+lookup, rejected codes and tokens, and connection reuse.
+
+    python tools/check_oauth_client.py
+
+``token_uri`` and ``userinfo_uri`` point at the stub, so no network or real
+credentials are needed.
+"""
+import json
+import logging
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from streamlit import logger as streamlit_logger
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+CLIENT_ID = "client-id.apps.googleusercontent.com"
+CLIENT_SECRET = "client-secret"
+REDIRECT_URI = "http://localhost:8501/"
+CODE = "4/valid-code"
+ACCESS_TOKEN = "ya29.access-token"
+USERINFO = {"id": "1234", "email": "sposa@gmail.com", "verified_email": True, "name": "Sposa"}
+
+
+class FakeGoogle:
+    """
+    Issues ``ACCESS_TOKEN`` for ``CODE`` only, and records the form of every
+    token request and the client port of every request.
+    """
+
+    def __init__(self):
+        self.token_requests = []
+        self.ports = []
+
+
+def make_handler(google):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, so a reused session shows up as a single client port
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            google.ports.append(self.client_address[1])
+            length = int(self.headers.get("Content-Length", 0))
+            form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+            if urlparse(self.path).path != "/token":
+                return self.send_json(404, {"error": "not_found"})
+            google.token_requests.append(form)
+            if form.get("code") != CODE or form.get("client_secret") != CLIENT_SECRET:
+                return self.send_json(400, {"error": "invalid_grant"})
+            self.send_json(
+                200,
+                {"access_token": ACCESS_TOKEN, "expires_in": 3599, "token_type": "Bearer", "id_token": "jwt"},
+            )
+
+        def do_GET(self):
+            google.ports.append(self.client_address[1])
+            if urlparse(self.path).path != "/userinfo":
+                return self.send_json(404, {"error": "not_found"})
+            if self.headers.get("Authorization") != f"Bearer {ACCESS_TOKEN}":
+                return self.send_json(401, {"error": "invalid_token"})
+            self.send_json(200, USERINFO)
+
+    return Handler
+
+
+def check(description, condition):
+    print(f"{'ok  ' if condition else 'FAIL'} {description}")
+    if not condition:
+        raise SystemExit(1)
+
+
+def raises_http_error(action, status):
+    try:
+        action()
+    except requests.HTTPError as e:
+        return e.response.status_code == status
+    return False
+
+
+def main():
+    # The module is imported outside a running app
+    streamlit_logger.set_log_level(logging.ERROR)
+    from auth.oauth_client import OAuthClient
+
+    google = FakeGoogle()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(google))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"http://127.0.0.1:{server.server_port}"
+
+    client = OAuthClient(
+        {
+            "web": {
+                "client_id": CLIENT_ID,
+                "client_secret": CLIENT_SECRET,
+                "auth_uri": f"{host}/auth",
+                "token_uri": f"{host}/token",
+            }
+        },
+        REDIRECT_URI,
+        userinfo_uri=f"{host}/userinfo",
+        timeout=5.0,
+    )
+
+    url = urlparse(client.authorization_url)
+    query = {key: values[0] for key, values in parse_qs(url.query).items()}
+    check("authorization URL on the configured endpoint", f"{url.scheme}://{url.netloc}{url.path}" == f"{host}/auth")
+    check("authorization URL carries client, redirect and scopes", (
+        query["client_id"] == CLIENT_ID
+        and query["redirect_uri"] == REDIRECT_URI
+        and query["response_type"] == "code"
+        and query["scope"].split() == client.scopes
+    ))
+
+    token = client.exchange_code(CODE)
+    check("code exchanged for an access token", token["access_token"] == ACCESS_TOKEN)
+    check("token request is an authorization_code grant", google.token_requests[-1] == {
+        "code": CODE,
+        "client_id": CLIENT_ID,
+        "client_secret": CLIENT_SECRET,
+        "redirect_uri": REDIRECT_URI,
+        "grant_type": "authorization_code",
+    })
+    check("userinfo fetched with the access token", client.fetch_userinfo(token["access_token"]) == USERINFO)
+
+    check("rejected code raises", raises_http_error(lambda: client.exchange_code("4/expired"), 400))
+    check("rejected token raises", raises_http_error(lambda: client.fetch_userinfo("ya29.revoked"), 401))
+
+    google.ports.clear()
+    for _ in range(3):
+        client.fetch_userinfo(client.exchange_code(CODE)["access_token"])
+    check(f"one connection reused for {len(google.ports)} requests", len(set(google.ports)) == 1)
+
+    server.shutdown()
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    main()
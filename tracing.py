@@ -0,0 +1,241 @@
+"""
+Lightweight per-rerun tracing: nested timed spans recorded in memory and
+exported as one JSON document per rerun, with OpenTelemetry (OTLP/JSON) field
+names so the logs can be shipped to a collector as they are.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+
+from store import ObjectInfo, StorageBackend, StoredObject
+
+logger = logging.getLogger("wedding_budget.trace")
+
+_current_tracer = contextvars.ContextVar("current_tracer", default=None)
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    duration: float = 0.0
+    attributes: dict = field(default_factory=dict)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_otel(self, trace_id: str) -> dict:
+        return {
+            "traceId": trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.start_ns + int(self.duration * 1e9)),
+            "attributes": [
+                {"key": key, "value": _otel_value(value)} for key, value in self.attributes.items()
+            ],
+        }
+
+
+def _otel_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Collects the spans of one rerun. Spans opened while another is open become
+    its children.
+    """
+
+    def __init__(self, name: str = "rerun", started: Optional[float] = None):
+        self.trace_id = os.urandom(16).hex()
+        self.started = time.perf_counter() if started is None else started
+        self.start_ns = time.time_ns() - int((time.perf_counter() - self.started) * 1e9)
+        self.root = Span(name, os.urandom(8).hex(), None, self.start_ns)
+        self.spans: List[Span] = [self.root]
+        self._stack = [self.root]
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        span = Span(name, os.urandom(8).hex(), self._stack[-1].span_id, time.time_ns(), attributes=attributes)
+        self.spans.append(span)
+        self._stack.append(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            # Streamlit's rerun/stop exceptions end up here too
+            span.set(exception=type(e).__name__)
+            raise
+        finally:
+            span.duration = time.perf_counter() - started
+            self._stack.remove(span)
+
+    def record(self, name: str, duration: float, **attributes):
+        """
+        Add a span measured elsewhere (e.g. on a background thread).
+        """
+        start_ns = time.time_ns() - int(duration * 1e9)
+        self.spans.append(Span(name, os.urandom(8).hex(), self.root.span_id, start_ns, duration, attributes))
+
+    def finish(self, **attributes) -> dict:
+        """
+        Close the root span and return the trace as an OTLP/JSON resource span.
+        """
+        self.root.duration = time.perf_counter() - self.started
+        self.root.set(**attributes)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "wedding-budget"}}]},
+                "scopeSpans": [{
+                    "scope": {"name": "wedding_budget"},
+                    "spans": [span.to_otel(self.trace_id) for span in self.spans],
+                }],
+            }],
+        }
+
+    def breakdown(self) -> List[dict]:
+        """
+        Flat list of the spans, depth first, with their nesting level.
+        """
+        children = {}
+        for span in self.spans[1:]:
+            children.setdefault(span.parent_id, []).append(span)
+        rows = []
+
+        def visit(span, depth):
+            rows.append({
+                "name": span.name,
+                "depth": depth,
+                "ms": round(span.duration * 1000, 1),
+                **span.attributes,
+            })
+            for child in children.get(span.span_id, []):
+                visit(child, depth + 1)
+
+        visit(self.root, 0)
+        return rows
+
+
+def start_trace(name: str = "rerun", started: Optional[float] = None) -> Tracer:
+    """
+    Start a trace and make it current for this thread (the rerun's script thread).
+    """
+    tracer = Tracer(name, started)
+    _current_tracer.set(tracer)
+    return tracer
+
+
+def current_tracer() -> Optional[Tracer]:
+    return _current_tracer.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a block within the current trace; a no-op outside of one, e.g. on the
+    write queue's background thread.
+    """
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield _NOOP_SPAN
+        return
+    with tracer.span(name, **attributes) as current:
+        yield current
+
+
+def traced(name: str):
+    """
+    Decorator form of :func:`span`.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracedBackend(StorageBackend):
+    """
+    Wraps a storage backend so each call shows up as a span in the current
+    trace, e.g. the metadata check separately from the download.
+    """
+
+    def __init__(self, backend: StorageBackend):
+        self.backend = backend
+
+    def generation(self, name: str) -> Optional[int]:
+        with span("storage.generation", object=name):
+            return self.backend.generation(name)
+
+    def read(self, name: str) -> Optional[StoredObject]:
+        with span("storage.read", object=name) as current:
+            stored = self.backend.read(name)
+            current.set(bytes=len(stored.data) if stored is not None else 0)
+            return stored
+
+    def read_many(self, names: Iterable[str]) -> List[Optional[StoredObject]]:
+        names = list(names)
+        with span("storage.read_many", objects=len(names)) as current:
+            objects = self.backend.read_many(names)
+            current.set(bytes=sum(len(stored.data) for stored in objects if stored is not None))
+            return objects
+
+    def write(self, name: str, data: bytes, if_generation_match: Optional[int] = None) -> int:
+        with span("storage.write", object=name, bytes=len(data)):
+            return self.backend.write(name, data, if_generation_match=if_generation_match)
+
+    def list(self, prefix: str, start_offset: Optional[str] = None) -> List[ObjectInfo]:
+        with span("storage.list", prefix=prefix) as current:
+            objects = self.backend.list(prefix, start_offset=start_offset)
+            current.set(objects=len(objects))
+            return objects
+
+
+def enable_trace_log(stream=None):
+    """
+    Send the trace lines to ``stream`` (stderr by default) as they are, without
+    relying on how the root logger is set up. Safe to call more than once.
+    """
+    logger.setLevel(logging.INFO)
+    if not any(getattr(handler, "trace_log", False) for handler in logger.handlers):
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        handler.trace_log = True
+        logger.addHandler(handler)
+    # The JSON lines are not repeated by the root logger's handlers
+    logger.propagate = False
+
+
+def export_trace(trace: dict):
+    """
+    Write the trace as a single JSON log line.
+    """
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(trace, separators=(",", ":")))